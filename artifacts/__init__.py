@@ -0,0 +1,3 @@
+from .automata import CachedDFA, cached_dfa
+from .grammars import cached_cnf
+from .store import ArtifactCache
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import struct
+import sys
+from array import array
+
+from .store import KIND_DFA, canonical_key, source_digest
+
+# DFA payload:
+#
+#   u32 states, u32 symbols, u32 meta length (little-endian)
+#   meta     JSON {"alphabet": [...], "symbols": [...]}, padded to 4 bytes
+#   table    i32[states * symbols] in native byte order, so it can be used
+#            in place; next state or -1 (no transition)
+#   final    u8[states]
+#
+# State i is "q{i}", the names convert_to_dfa and minimize give their
+# states, and state 0 is the start state.
+
+COUNTS = struct.Struct('<III')
+
+def dfa_key(automaton, minimize):
+    # The transitions, by far the largest part, are hashed as sorted flat
+    # lines rather than canonical JSON; that keeps a cache hit cheap next
+    # to the conversion it saves.
+    head = canonical_key('dfa', source_digest(automaton), sys.byteorder, minimize,
+                         sorted(map(str, automaton.states)), sorted(map(str, automaton.alphabet)),
+                         str(automaton.start_state), sorted(map(str, automaton.final_states)))
+    separator = '\1'
+    lines = sorted(f"{state}\0{symbol}\0{separator.join(sorted(next_states))}"
+                   for (state, symbol), next_states in automaton.transitions.items())
+    digest = hashlib.sha256(head)
+    digest.update('\n'.join(lines).encode('utf-8'))
+    return digest.digest()
+
+def encode_dfa(dfa):
+    names = [f"q{i}" for i in range(len(dfa.states))]
+    if set(names) != dfa.states or dfa.start_state != "q0":
+        raise ValueError("Only automata with states q0..qN (as built by convert_to_dfa) can be cached")
+    symbols = sorted(set(dfa.alphabet) | {symbol for _, symbol in dfa.transitions})
+    symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+    index = {name: i for i, name in enumerate(names)}
+    width = len(symbols)
+    table = [-1] * (len(names) * width)
+    for (state, symbol), next_states in dfa.transitions.items():
+        if next_states:
+            table[index[state] * width + symbol_index[symbol]] = index[next_states[0]]
+    meta = json.dumps({'alphabet': sorted(dfa.alphabet), 'symbols': symbols}).encode('utf-8')
+    meta += b' ' * (-len(meta) % 4)
+    final = bytes(name in dfa.final_states for name in names)
+    return b''.join([COUNTS.pack(len(names), width, len(meta)), meta, array('i', table).tobytes(), final])
+
+class CachedDFA:
+    # Matcher over a DFA payload, typically memory-mapped straight from the
+    # cache: the transition table is read in place, never copied into dicts.
+    def __init__(self, payload, automaton_class=None):
+        states, width, meta_length = COUNTS.unpack_from(payload)
+        offset = COUNTS.size
+        meta = json.loads(bytes(payload[offset:offset + meta_length]))
+        offset += meta_length
+        self.states = states
+        self.alphabet = meta['alphabet']
+        self.symbols = meta['symbols']
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.width = width
+        self.table = payload[offset:offset + 4 * states * width].cast('i')
+        offset += 4 * states * width
+        self.final = payload[offset:offset + states]
+        self.automaton_class = automaton_class
+
+    def accepts(self, input_string):
+        table, width, symbol_index = self.table, self.width, self.symbol_index
+        state = 0
+        for symbol in input_string:
+            symbol_id = symbol_index.get(symbol)
+            if symbol_id is None:
+                return False
+            state = table[state * width + symbol_id]
+            if state < 0:
+                return False
+        return bool(self.final[state])
+
+    def to_automaton(self, automaton_class=None):
+        automaton_class = automaton_class or self.automaton_class
+        if automaton_class is None:
+            raise ValueError("No Automaton class to build")
+        table, width, symbols = self.table, self.width, self.symbols
+        transitions = {}
+        for state in range(self.states):
+            row = state * width
+            for symbol_id in range(width):
+                next_state = table[row + symbol_id]
+                if next_state >= 0:
+                    transitions[(f"q{state}", symbols[symbol_id])] = [f"q{next_state}"]
+        return automaton_class(
+            states={f"q{i}" for i in range(self.states)},
+            alphabet=set(self.alphabet),
+            transitions=transitions,
+            start_state="q0",
+            final_states={f"q{i}" for i in range(self.states) if self.final[i]},
+        )
+
+def cached_dfa(automaton, cache, minimize=False):
+    # convert_to_dfa (then minimize, if asked) through the cache. Returns a
+    # CachedDFA; call to_automaton() on it for a regular Automaton.
+    key = dfa_key(automaton, minimize)
+    payload = cache.get(key, KIND_DFA)
+    if payload is None:
+        dfa = automaton.convert_to_dfa()
+        if minimize:
+            dfa = dfa.minimize()
+        payload = encode_dfa(dfa)
+        cache.put(key, KIND_DFA, payload)
+        payload = memoryview(payload)
+    return CachedDFA(payload, type(automaton))
@@ -0,0 +1,97 @@
+import json
+import struct
+import sys
+from array import array
+
+from .store import KIND_CNF, canonical_key, source_digest
+
+# CNF payload:
+#
+#   u32 meta length (little-endian)
+#   meta     JSON: symbol names, variable flags, start symbol, the CFG's
+#            fresh-name counter and terminal map, and the to_cnf history;
+#            padded to 4 bytes
+#   rules    i32 in native byte order: for every left side in order
+#            lhs, rule count, then per rule its length and symbol ids
+#
+# Symbols keep their ids, so the restored CFG is the one to_cnf would have
+# left behind, down to rule order.
+
+LENGTH = struct.Struct('<I')
+
+def cnf_key(cfg, order):
+    # to_cnf's output (fresh names, rule order) depends on symbol ids and
+    # rule order, so the key covers the CFG exactly as interned rather than
+    # a sorted normal form.
+    symbols = cfg.symbols
+    productions = [[lhs, [list(rhs) for rhs in rhs_list]] for lhs, rhs_list in cfg.productions.items()]
+    return canonical_key('cnf', source_digest(cfg), sys.byteorder, list(order), symbols.names,
+                         symbols.is_variable, symbols.fresh_counter, cfg.start_symbol,
+                         sorted(cfg.terminal_to_variable.items()), productions)
+
+def encode_cnf(cfg, history):
+    symbols = cfg.symbols
+    meta = json.dumps({
+        'names': symbols.names,
+        'is_variable': symbols.is_variable,
+        'fresh_counter': symbols.fresh_counter,
+        'start': cfg.start_symbol,
+        'terminal_to_variable': list(cfg.terminal_to_variable.items()),
+        'history': history,
+    }, ensure_ascii=False).encode('utf-8')
+    meta += b' ' * (-len(meta) % 4)
+    rules = array('i')
+    for lhs, rhs_list in cfg.productions.items():
+        rules.append(lhs)
+        rules.append(len(rhs_list))
+        for rhs in rhs_list:
+            rules.append(len(rhs))
+            rules.extend(rhs)
+    return b''.join([LENGTH.pack(len(meta)), meta, rules.tobytes()])
+
+def decode_cnf(payload, cfg):
+    # Replaces cfg's symbols and productions with the cached CNF grammar and
+    # returns the recorded to_cnf history.
+    (meta_length,) = LENGTH.unpack_from(payload)
+    offset = LENGTH.size
+    meta = json.loads(bytes(payload[offset:offset + meta_length]))
+    rules = payload[offset + meta_length:].cast('i')
+
+    symbols = type(cfg.symbols)()
+    symbols.names = meta['names']
+    symbols.is_variable = meta['is_variable']
+    symbols.ids = {name: symbol for symbol, name in enumerate(symbols.names)}
+    symbols.fresh_counter = meta['fresh_counter']
+
+    productions = {}
+    position = 0
+    end = len(rules)
+    while position < end:
+        lhs, count = rules[position], rules[position + 1]
+        position += 2
+        rhs_list = []
+        for _ in range(count):
+            length = rules[position]
+            rhs_list.append(tuple(rules[position + 1:position + 1 + length]))
+            position += 1 + length
+        productions[lhs] = rhs_list
+
+    cfg.symbols = symbols
+    cfg.productions = productions
+    cfg.start_symbol = meta['start']
+    cfg.terminal_to_variable = dict(meta['terminal_to_variable'])
+    cfg.used_variables = {symbol for symbol, variable in enumerate(symbols.is_variable) if variable}
+    return meta['history']
+
+def cached_cnf(cfg, cache, order=None):
+    # Drop-in for cfg.to_cnf(order): converts cfg in place, through the
+    # cache, and returns the stage history (as recorded when the entry was
+    # built, on a hit).
+    order = cfg.CNF_ORDER if order is None else tuple(order)
+    key = cnf_key(cfg, order)
+    payload = cache.get(key, KIND_CNF)
+    if payload is not None:
+        return decode_cnf(payload, cfg)
+    history = cfg.to_cnf(order)
+    cache.put(key, KIND_CNF, encode_cnf(cfg, history))
+    return history
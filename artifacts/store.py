@@ -0,0 +1,162 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+# Content-addressed cache of compiled artifacts. An entry is one file named
+# after the hex digest of its key:
+#
+#   header   64 bytes: magic, format version, kind, key digest, payload
+#            length and CRC-32 of the payload
+#   payload  kind-specific binary layout (see automata.py and grammars.py)
+#
+# Entries are memory-mapped on load, so a payload is only paged in as it is
+# read. Anything that does not check out (short file, other magic, format or
+# kind, a key that is not its own, wrong length or checksum) is deleted and
+# reported as a miss. Writes go to a temporary file that is renamed into
+# place, so readers never see a partial entry. When the directory grows past
+# max_bytes the least recently used entries (by mtime, refreshed on every
+# hit) are evicted.
+
+MAGIC = b'LFAC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHH32sQI12x')
+
+KIND_DFA = 1
+KIND_CNF = 2
+
+SUFFIX = '.bin'
+
+def canonical_key(*parts):
+    # SHA-256 of the parts as canonical JSON (sorted keys, no whitespace).
+    text = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+_source_digests = {}
+
+def source_digest(obj):
+    # Digest of the file defining obj's class. It is part of every key, so
+    # editing a lab makes its old entries unreachable instead of stale; they
+    # then age out through eviction.
+    path = sys.modules[type(obj).__module__].__file__
+    digest = _source_digests.get(path)
+    if digest is None:
+        with open(path, 'rb') as f:
+            digest = _source_digests[path] = hashlib.sha256(f.read()).hexdigest()
+    return digest
+
+class ArtifactCache:
+    def __init__(self, directory, max_bytes=256 * 2 ** 20, verify=True):
+        if max_bytes < HEADER.size:
+            raise ValueError(f"max_bytes must be at least {HEADER.size}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.verify = verify
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.corrupt = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key.hex() + SUFFIX)
+
+    def get(self, key, kind):
+        # Read-only memoryview of the payload, or None.
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if mapped is None or not self._valid(mapped, key, kind):
+            if mapped is not None:
+                mapped.close()
+            self.corrupt += 1
+            self.misses += 1
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return memoryview(mapped)[HEADER.size:]
+
+    def _valid(self, mapped, key, kind):
+        if len(mapped) < HEADER.size:
+            return False
+        magic, version, entry_kind, entry_key, length, crc = HEADER.unpack_from(mapped)
+        if magic != MAGIC or version != FORMAT_VERSION or entry_kind != kind or entry_key != key:
+            return False
+        if length != len(mapped) - HEADER.size:
+            return False
+        if self.verify:
+            with memoryview(mapped) as view:
+                if zlib.crc32(view[HEADER.size:]) != crc:
+                    return False
+        return True
+
+    def put(self, key, kind, payload):
+        path = self.path(key)
+        temporary = os.path.join(self.directory, f'.{key.hex()}.{os.getpid()}.tmp')
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, kind, key, len(payload), zlib.crc32(payload))
+        with open(temporary, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(temporary, path)
+        self.evict(keep=path)
+
+    def entries(self):
+        # (mtime, size, path) of every entry, oldest first.
+        result = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(SUFFIX):
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    result.append((info.st_mtime_ns, info.st_size, entry.path))
+        result.sort()
+        return result
+
+    def evict(self, keep=None):
+        # Drops least recently used entries until the total fits max_bytes;
+        # keep (the entry just written) goes last.
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        entries.sort(key=lambda entry: entry[2] == keep)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            self.evictions += 1
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "corrupt": self.corrupt,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
@@ -0,0 +1 @@
+from .suite import CASES, SIZES, Workload, case, compare, measure, run_suite
@@ -0,0 +1,126 @@
+import random
+import string
+
+# Seeded synthetic inputs for the labs. Every generator is a pure function of
+# its arguments, so a (size, seed) pair always names the same workload.
+
+def random_regular_grammar(variables, terminals=4, rules=3, seed=0):
+    # Right-linear grammar in the lab-1 format: single-character variables
+    # (at most 26), rules "aB" or "a". A variable never has two rules on the
+    # same terminal, so FiniteAutomaton.accepts, which follows the first
+    # target only, decides the grammar's language. Every variable gets one
+    # terminating rule, so all of them are productive.
+    if not 1 <= variables <= 26:
+        raise ValueError("lab-1 grammars use single letters: 1 to 26 variables")
+    rng = random.Random(seed)
+    names = list(string.ascii_uppercase[:variables])
+    alphabet = list(string.ascii_lowercase[:terminals])
+    P = {}
+    for name in names:
+        chosen = rng.sample(alphabet, min(rules, terminals))
+        P[name] = [chosen[0]] + [symbol + rng.choice(names) for symbol in chosen[1:]]
+    return set(names), set(alphabet), P, names[0]
+
+def random_nfa(states, symbols=3, block=6, density=0.4, final_rate=0.2, seed=0):
+    # States come in blocks of `block`; for each block and symbol every
+    # member moves to a random subset of one randomly chosen block. Subset
+    # construction then never mixes blocks, so the DFA has at most
+    # blocks * (2^block - 1) states and grows roughly linearly with `states`
+    # instead of exploding as fully random NFAs do. Returns the arguments of
+    # lab-2 Automaton.
+    rng = random.Random(seed)
+    names = [f"q{i}" for i in range(states)]
+    alphabet = [chr(ord('a') + i) for i in range(symbols)]
+    blocks = (states + block - 1) // block
+    transitions = {}
+    for b in range(blocks):
+        members = names[b * block:(b + 1) * block]
+        for symbol in alphabet:
+            target = rng.randrange(blocks)
+            candidates = names[target * block:(target + 1) * block]
+            for name in members:
+                next_states = [state for state in candidates if rng.random() < density]
+                if next_states:
+                    transitions[(name, symbol)] = next_states
+    final_states = {name for name in names if rng.random() < final_rate}
+    return set(names), set(alphabet), transitions, names[0], final_states
+
+def random_cfg(variables, rules=4, max_length=4, terminals=3, epsilon_rate=0.05, unit_rate=0.1, seed=0):
+    # Productions in the lab-5 list-of-names format over variables V0..Vn
+    # and single-letter terminals. Rule 0 of every variable is all
+    # terminals, so every variable is productive; the rest mix variables and
+    # terminals, with some unit and ε rules so every CNF stage has work.
+    rng = random.Random(seed)
+    names = [f"V{i}" for i in range(variables)]
+    alphabet = list(string.ascii_lowercase[:terminals])
+    productions = {}
+    for name in names:
+        rhs_list = [[rng.choice(alphabet) for _ in range(rng.randint(1, 2))]]
+        for _ in range(rules - 1):
+            r = rng.random()
+            if r < epsilon_rate:
+                rhs_list.append('ε')
+            elif r < epsilon_rate + unit_rate:
+                rhs_list.append([rng.choice(names)])
+            else:
+                rhs_list.append([rng.choice(names) if rng.random() < 0.6 else rng.choice(alphabet)
+                                 for _ in range(rng.randint(2, max_length))])
+        productions[name] = rhs_list
+    return productions, names[0]
+
+def sample_sentences(productions, start, count, min_length=1, max_length=24, max_depth=12, seed=0):
+    # Random derivations from a random_cfg grammar, keeping those whose
+    # length falls in [min_length, max_length]. Past max_depth only rule 0
+    # (all terminals) is used, so every derivation terminates.
+    rng = random.Random(seed)
+    sentences = []
+    attempts = 0
+    while len(sentences) < count:
+        attempts += 1
+        if attempts > 100 * count:
+            raise ValueError(f"The grammar rarely derives sentences of {min_length} to {max_length} symbols")
+        output = []
+        stack = [(start, 0)]
+        while stack and len(output) <= max_length:
+            symbol, depth = stack.pop()
+            if symbol not in productions:
+                output.append(symbol)
+                continue
+            rhs_list = productions[symbol]
+            rhs = rhs_list[0] if depth >= max_depth else rng.choice(rhs_list)
+            if rhs == 'ε':
+                continue
+            stack.extend((child, depth + 1) for child in reversed(rhs))
+        if not stack and min_length <= len(output) <= max_length:
+            sentences.append(''.join(output))
+    return sentences
+
+def timeline_document(size, seed=0):
+    # Valid lab-6 timeline DSL of at least `size` characters: a comma
+    # separated list of event/person/link statements with positional
+    # strings, years, year ranges and assignments, broken over lines.
+    rng = random.Random(seed)
+    keywords = ('event', 'person', 'link')
+    identifiers = ('born', 'died', 'type', 'caused', 'related')
+    words = ('battle', 'treaty', 'war', 'king', 'empire', 'revolution', 'of', 'the')
+    parts = []
+    length = 0
+    while length < size:
+        args = []
+        for _ in range(rng.randint(1, 4)):
+            r = rng.random()
+            if r < 0.3:
+                args.append('"' + ' '.join(rng.choice(words) for _ in range(rng.randint(1, 4))) + '"')
+            elif r < 0.45:
+                args.append(str(rng.randint(1, 2024)))
+            elif r < 0.6:
+                year = rng.randint(1, 2000)
+                args.append(f'{year}-{year + rng.randint(1, 24)}')
+            else:
+                value = rng.choice((f'"{rng.choice(words)}"', str(rng.randint(1, 2024))))
+                args.append(f'{rng.choice(identifiers)} = {value}')
+        statement = f'{rng.choice(keywords)}({", ".join(args)})'
+        separator = ',\n' if rng.random() < 0.2 else ', '
+        parts.append(statement + separator)
+        length += len(statement) + 2
+    return ''.join(parts)[:-2]
@@ -0,0 +1,110 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import labs
+
+# Opt-in instrumentation of the lab hot paths. Each instrumented module has a
+# STATS global that is None by default; instrument() points it at a Stats
+# object for the duration of a with block, and the module then reports every
+# conversion, lex or parse through Stats.record:
+#
+#   convert_to_dfa  nfa_states, states_explored, transitions_built (lab-2)
+#   cnf.<STAGE>     rules_in, rules_out, symbols, size (lab-5 CFG.to_cnf)
+#   lexer           chars, tokens, regex_seconds (lab-6 lexer.lexer)
+#   parser          tokens, nodes (Parser.parse; parser.arena for parse_arena)
+#
+# Outside a with block the hot paths only read one global per call.
+
+# Counters reported per second of wall time in summary().
+RATES = ('chars', 'tokens', 'nodes', 'states_explored', 'transitions_built')
+
+class Stats:
+    # memory=True tracks the tracemalloc peak over instrumented blocks;
+    # profile=True also runs cProfile inside them.
+    def __init__(self, memory=False, profile=False):
+        self.memory = memory
+        self.profiler = cProfile.Profile() if profile else None
+        self.totals = {}
+        self.events = []
+        self.peak_bytes = None
+        self.origin = time.perf_counter()
+
+    def record(self, name, started, ended=None, **counters):
+        if ended is None:
+            ended = time.perf_counter()
+        total = self.totals.get(name)
+        if total is None:
+            total = self.totals[name] = {'calls': 0, 'seconds': 0.0}
+        total['calls'] += 1
+        total['seconds'] += ended - started
+        for key, value in counters.items():
+            total[key] = total.get(key, 0) + value
+        self.events.append((name, started, ended - started, counters))
+
+    def summary(self):
+        result = {}
+        for name, total in self.totals.items():
+            entry = dict(total)
+            for key in RATES:
+                if key in total and total['seconds']:
+                    entry[f'{key}_per_second'] = total[key] / total['seconds']
+            result[name] = entry
+        return result
+
+    def report(self):
+        for name, entry in self.summary().items():
+            counters = ', '.join(f'{key}={value:,}' if isinstance(value, int) else f'{key}={value:.4g}'
+                                 for key, value in entry.items() if key not in ('calls', 'seconds'))
+            print(f"{name:<26} {entry['calls']:>6} call(s) {entry['seconds'] * 1000:>10.1f}ms  {counters}")
+        if self.peak_bytes is not None:
+            print(f"peak traced memory: {self.peak_bytes / 2 ** 20:.1f}MiB")
+
+    def write_chrome_trace(self, path):
+        # Trace Event Format "complete" events, microseconds since the Stats
+        # object was created; opens in chrome://tracing and Perfetto.
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': 0,
+                   'ts': (started - self.origin) * 1e6, 'dur': seconds * 1e6, 'args': counters}
+                  for name, started, seconds, counters in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def write_profile(self, path):
+        # pstats format: python -m pstats, snakeviz, ...
+        if self.profiler is None:
+            raise RuntimeError("Stats was created without profile=True")
+        self.profiler.dump_stats(path)
+
+def default_modules():
+    return [labs.lab2(), labs.lab5(), *labs.lab6()]
+
+@contextmanager
+def instrument(stats=None, modules=None):
+    # Points STATS of every module (lab-2, lab-5 and the lab-6 lexer and
+    # parser by default) at stats for the block and restores it afterwards.
+    stats = Stats() if stats is None else stats
+    modules = default_modules() if modules is None else modules
+    previous = [module.STATS for module in modules]
+    for module in modules:
+        module.STATS = stats
+    tracing = stats.memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if stats.profiler is not None:
+        stats.profiler.enable()
+    try:
+        yield stats
+    finally:
+        if stats.profiler is not None:
+            stats.profiler.disable()
+        if stats.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            stats.peak_bytes = max(stats.peak_bytes or 0, peak)
+        if tracing:
+            tracemalloc.stop()
+        for module, value in zip(modules, previous):
+            module.STATS = value
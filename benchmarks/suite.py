@@ -0,0 +1,323 @@
+import argparse
+import fnmatch
+import gc
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import labs
+from artifacts import ArtifactCache, cached_cnf, cached_dfa
+
+from . import generators
+from .instrument import Stats, instrument
+
+# Cross-lab benchmark suite. Every case builds its input from a seeded
+# generator (untimed), then times the operation alone:
+#
+#   python -m benchmarks                          # all cases, small + medium
+#   python -m benchmarks --sizes large --cases 'lab6.*'
+#   python -m benchmarks --output base.json       # store a baseline
+#   python -m benchmarks --baseline base.json     # exit 1 on regressions
+#   python -m benchmarks --stats --trace trace.json --profile run.prof
+#
+# Time is the best of the timed runs (the least noisy estimate on a shared
+# machine); peak memory comes from one extra run under tracemalloc, which
+# slows Python down too much to be timed at the same time. Instrumentation
+# (see instrument.py) likewise only runs in one extra, untimed run per case.
+
+SIZES = {'small': 1, 'medium': 4, 'large': 16}
+DEFAULT_SIZES = ('small', 'medium')
+
+CASES = {}
+
+class Workload:
+    # prepare() builds a fresh input for one run (untimed), run(input) is
+    # the measured operation; units counts what throughput is reported in.
+    def __init__(self, prepare, run, units, unit):
+        self.prepare = prepare
+        self.run = run
+        self.units = units
+        self.unit = unit
+
+def case(name):
+    def register(build):
+        CASES[name] = build
+        return build
+    return register
+
+@case('lab1.iter_strings')
+def lab1_iter_strings(scale, seed):
+    lab1 = labs.lab1()
+    grammar = lab1.Grammar(*generators.random_regular_grammar(26, seed=seed))
+    count = 20000 * scale
+    return Workload(lambda: grammar, lambda g: sum(1 for _ in g.iter_strings(count, seed=seed, max_length=64)),
+                    count, 'strings')
+
+@case('lab1.accepts_many')
+def lab1_accepts_many(scale, seed):
+    lab1 = labs.lab1()
+    grammar = lab1.Grammar(*generators.random_regular_grammar(26, seed=seed))
+    strings = list(grammar.iter_strings(20000 * scale, seed=seed, max_length=64))
+
+    def prepare():
+        return grammar.to_finite_automaton()
+    return Workload(prepare, lambda automaton: automaton.accepts_many(strings), len(strings), 'strings')
+
+@case('lab2.convert_to_dfa')
+def lab2_convert_to_dfa(scale, seed):
+    lab2 = labs.lab2()
+    nfa = lab2.Automaton(*generators.random_nfa(1000 * scale, seed=seed))
+    return Workload(lambda: nfa, lambda a: a.convert_to_dfa(), len(nfa.states), 'nfa states')
+
+@case('lab2.minimize')
+def lab2_minimize(scale, seed):
+    lab2 = labs.lab2()
+    dfa = lab2.Automaton(*generators.random_nfa(1000 * scale, seed=seed)).convert_to_dfa()
+    return Workload(lambda: dfa, lambda a: a.minimize(), len(dfa.states), 'dfa states')
+
+@case('lab5.to_cnf')
+def lab5_to_cnf(scale, seed):
+    lab5 = labs.lab5()
+    productions, start = generators.random_cfg(100 * scale, seed=seed)
+    rules = sum(map(len, productions.values()))
+    return Workload(lambda: lab5.CFG(productions, start), lambda cfg: cfg.to_cnf(), rules, 'rules')
+
+def sentences_for(scale, seed):
+    # A fixed grammar and sentence length (parsing is cubic in the length),
+    # scaled by the number of sentences.
+    productions, start = generators.random_cfg(20, seed=seed)
+    sentences = generators.sample_sentences(productions, start, 10 * scale, min_length=8, seed=seed)
+    return productions, start, sentences
+
+@case('lab5.cyk')
+def lab5_cyk(scale, seed):
+    lab5 = labs.lab5()
+    productions, start, sentences = sentences_for(scale, seed)
+    cfg = lab5.CFG(productions, start)
+    cfg.to_cnf()
+    cyk = lab5.CYK(cfg)
+    return Workload(lambda: cyk, lambda c: [c.accepts(s) for s in sentences],
+                    sum(map(len, sentences)), 'symbols')
+
+@case('lab5.earley')
+def lab5_earley(scale, seed):
+    lab5 = labs.lab5()
+    productions, start, sentences = sentences_for(scale, seed)
+    earley = lab5.Earley(lab5.CFG(productions, start))
+    return Workload(lambda: earley, lambda e: [e.accepts(s) for s in sentences],
+                    sum(map(len, sentences)), 'symbols')
+
+@case('artifacts.dfa_hit')
+def artifacts_dfa_hit(scale, seed):
+    # Warm-cache counterpart of lab2.convert_to_dfa; the directory goes
+    # away with the workload.
+    lab2 = labs.lab2()
+    nfa = lab2.Automaton(*generators.random_nfa(1000 * scale, seed=seed))
+    directory = tempfile.TemporaryDirectory()
+    cache = ArtifactCache(directory.name)
+    cached_dfa(nfa, cache)
+    return Workload(lambda: (nfa, directory), lambda data: cached_dfa(data[0], cache),
+                    len(nfa.states), 'nfa states')
+
+@case('artifacts.cnf_hit')
+def artifacts_cnf_hit(scale, seed):
+    lab5 = labs.lab5()
+    productions, start = generators.random_cfg(100 * scale, seed=seed)
+    rules = sum(map(len, productions.values()))
+    directory = tempfile.TemporaryDirectory()
+    cache = ArtifactCache(directory.name)
+    cached_cnf(lab5.CFG(productions, start), cache)
+    return Workload(lambda: (lab5.CFG(productions, start), directory), lambda data: cached_cnf(data[0], cache),
+                    rules, 'rules')
+
+def document(scale, seed):
+    return generators.timeline_document(256 * 1024 * scale, seed=seed)
+
+@case('lab6.lexer')
+def lab6_lexer(scale, seed):
+    lexer, _ = labs.lab6()
+    code = document(scale, seed)
+    return Workload(lambda: code, lexer.lexer, len(code), 'chars')
+
+@case('lab6.lex_array')
+def lab6_lex_array(scale, seed):
+    lexer, _ = labs.lab6()
+    code = document(scale, seed)
+    return Workload(lambda: code, lexer.lex_array, len(code), 'chars')
+
+@case('lab6.iter_tokens')
+def lab6_iter_tokens(scale, seed):
+    # Streams the document in chunks; the tokens are checked against lexer()
+    # once up front, so chunk boundaries and line breaks stay covered.
+    lexer, _ = labs.lab6()
+    code = document(scale, seed)
+    data = code.encode('utf-8')
+
+    def stream(data):
+        return list(lexer.iter_tokens(io.BytesIO(data), 4096))
+    expected = [(token.type, token.value) for token in lexer.lexer(code)]
+    if [(token.type, token.value) for token in stream(data)] != expected:
+        raise RuntimeError("iter_tokens and lexer disagree on the benchmark document")
+    return Workload(lambda: data, stream, len(data), 'bytes')
+
+@case('lab6.parse')
+def lab6_parse(scale, seed):
+    lexer, parser = labs.lab6()
+    tokens = lexer.lexer(document(scale, seed))
+    return Workload(lambda: tokens, lambda t: parser.Parser(t).parse(), len(tokens), 'tokens')
+
+@case('lab6.parse_arena')
+def lab6_parse_arena(scale, seed):
+    lexer, parser = labs.lab6()
+    tokens = lexer.lex_array(document(scale, seed))
+    return Workload(lambda: tokens, lambda t: parser.Parser(t).parse_arena(), len(tokens), 'tokens')
+
+def measure(workload, repeat=3, memory=True, min_time=0.2):
+    # At least `repeat` runs, and more until min_time seconds were spent, so
+    # millisecond cases are not judged on a single scheduler hiccup.
+    times = []
+    while len(times) < repeat or (sum(times) < min_time and len(times) < 100):
+        data = workload.prepare()
+        gc.collect()
+        started = time.perf_counter()
+        workload.run(data)
+        times.append(time.perf_counter() - started)
+        del data
+    seconds = min(times)
+    result = {
+        'seconds': seconds,
+        'times': times,
+        'units': workload.units,
+        'unit': workload.unit,
+        'throughput': workload.units / seconds if seconds else None,
+    }
+    if memory:
+        data = workload.prepare()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            workload.run(data)
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run_suite(sizes=DEFAULT_SIZES, patterns=('*',), repeat=3, memory=True, seed=0, report=False, stats=None):
+    for size in sizes:
+        if size not in SIZES:
+            raise ValueError(f"Unknown size: {size} (expected one of {', '.join(SIZES)})")
+    names = [name for name in CASES if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    if not names:
+        raise ValueError(f"No case matches {', '.join(patterns)}")
+    results = []
+    for name in names:
+        for size in sizes:
+            workload = CASES[name](SIZES[size], seed)
+            entry = {'case': name, 'size': size, **measure(workload, repeat, memory)}
+            results.append(entry)
+            if stats is not None:
+                data = workload.prepare()
+                started = time.perf_counter()
+                with instrument(stats):
+                    workload.run(data)
+                stats.record(f'{name}[{size}]', started)
+            if report:
+                print(format_entry(entry), flush=True)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+def format_entry(entry):
+    line = (f"{entry['case']:<20} {entry['size']:<7} {entry['seconds'] * 1000:>10.1f}ms "
+            f"{entry['throughput']:>14,.0f} {entry['unit']}/s")
+    if 'peak_bytes' in entry:
+        line += f" {entry['peak_bytes'] / 2 ** 20:>9.1f}MiB peak"
+    return line
+
+def compare(current, baseline, threshold=0.25):
+    # Pairs entries by (case, size) and flags a metric as a regression when
+    # it grew by more than threshold over the baseline (improved when it
+    # shrank by as much). Entries missing on either side are skipped.
+    old = {(entry['case'], entry['size']): entry for entry in baseline['results']}
+    rows = []
+    for entry in current['results']:
+        before = old.get((entry['case'], entry['size']))
+        if before is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if metric not in entry or not before.get(metric):
+                continue
+            ratio = entry[metric] / before[metric]
+            status = 'regression' if ratio > 1 + threshold else 'improved' if ratio < 1 / (1 + threshold) else 'ok'
+            rows.append({'case': entry['case'], 'size': entry['size'], 'metric': metric,
+                         'baseline': before[metric], 'current': entry[metric],
+                         'ratio': ratio, 'status': status})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the lab pipelines.')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help=f"comma-separated sizes out of {', '.join(SIZES)}")
+    parser.add_argument('--cases', default='*', help='comma-separated case name patterns, e.g. lab6.*')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (the best counts)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory run')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative growth counted as a regression (default 0.25)')
+    parser.add_argument('--stats', action='store_true',
+                        help='print the instrumentation counters of an extra run per case')
+    parser.add_argument('--trace', help='write the instrumented runs as a Chrome trace to this file')
+    parser.add_argument('--profile', help='write a cProfile of the instrumented runs to this file')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(CASES))
+        return 0
+    stats = Stats(profile=bool(args.profile)) if args.stats or args.trace or args.profile else None
+    try:
+        results = run_suite(args.sizes.split(','), args.cases.split(','), args.repeat,
+                            not args.no_memory, args.seed, report=True, stats=stats)
+    except ValueError as e:
+        parser.error(str(e))
+    if stats is not None:
+        results['instrumentation'] = stats.summary()
+        if args.stats:
+            print()
+            stats.report()
+        if args.trace:
+            stats.write_chrome_trace(args.trace)
+        if args.profile:
+            stats.write_profile(args.profile)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.threshold)
+        results['comparison'] = {'baseline': args.baseline, 'threshold': args.threshold, 'rows': rows}
+        print(f"\nAgainst {args.baseline} (threshold {args.threshold:.0%}):")
+        for row in rows:
+            print(f"  {row['case']:<20} {row['size']:<7} {row['metric']:<10} "
+                  f"{row['ratio']:>6.2f}x  {row['status']}")
+        regressions = [row for row in rows if row['status'] == 'regression']
+        print(f"{len(regressions)} regression(s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
@@ -1,4 +1,14 @@
+import hashlib
+import multiprocessing
+import os
 import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class Grammar:
     def __init__(self, VN, VT, P, start_symbol):
@@ -21,6 +31,102 @@ class Grammar:
     def generate_multiple_strings(self, count=5):
         return [self.generate_string() for _ in range(count)]
 
+    def min_lengths(self):
+        # Shortest terminal yield of every non-terminal, used to abort a
+        # derivation as soon as it can no longer fit under max_length.
+        shortest = {}
+        changed = True
+        while changed:
+            changed = False
+            for non_terminal, productions in self.P.items():
+                for production in productions:
+                    if all(symbol not in self.VN or symbol in shortest for symbol in production):
+                        length = sum(shortest.get(symbol, 1) for symbol in production)
+                        if length < shortest.get(non_terminal, float("inf")):
+                            shortest[non_terminal] = length
+                            changed = True
+        return shortest
+
+    def iter_strings(self, count=None, seed=None, min_length=0, max_length=None, max_steps=100000,
+                     max_attempts=10000):
+        # Leftmost derivation on a symbol stack: every step either emits one
+        # terminal or pushes one production, so a string costs time linear in
+        # its derivation. Derivations that overrun max_length or max_steps, or
+        # fall short of min_length, are abandoned and retried; max_attempts
+        # failures in a row mean the bounds are (practically) unsatisfiable.
+        choice = random.Random(seed).choice
+        shortest = self.min_lengths()
+        if self.start_symbol not in shortest:
+            raise ValueError("The start symbol derives no terminal string")
+        limit = float("inf") if max_length is None else max_length
+        if shortest[self.start_symbol] > limit:
+            raise ValueError(f"No string is shorter than {shortest[self.start_symbol]} symbols")
+        # Each rule is stored reversed for the stack, together with how much
+        # it changes the minimum length still owed by the pending symbols.
+        productions = {}
+        for non_terminal, rules in self.P.items():
+            productions[non_terminal] = [
+                (list(reversed(rule)),
+                 sum(shortest.get(symbol, 1) for symbol in rule) - shortest.get(non_terminal, 0))
+                for rule in rules
+            ]
+
+        produced = 0
+        failures = 0
+        while count is None or produced < count:
+            if failures >= max_attempts:
+                raise ValueError(f"No derivation met min_length={min_length}, max_length={max_length}, "
+                                 f"max_steps={max_steps} in {max_attempts} attempts")
+            failures += 1
+            stack = [self.start_symbol]
+            output = []
+            push, pop, emit = stack.extend, stack.pop, output.append
+            pending = shortest[self.start_symbol]
+            steps = 0
+            while stack:
+                symbol = pop()
+                steps += 1
+                rules = productions.get(symbol)
+                if rules is None:
+                    emit(symbol)
+                    pending -= 1
+                    continue
+                rule, delta = choice(rules)
+                pending += delta
+                if len(output) + pending > limit or steps >= max_steps:
+                    break
+                push(rule)
+            else:
+                if len(output) < min_length:
+                    continue
+                failures = 0
+                produced += 1
+                yield "".join(output)
+
+    def write_strings(self, path, count, **options):
+        with open(path, "w") as f:
+            for s in self.iter_strings(count, **options):
+                f.write(s)
+                f.write("\n")
+
+    def generate_parallel(self, count, prefix, workers=None, seed=0, ordered=True, shards=None, **options):
+        # Splits the corpus into shards, each generated and written by a pool
+        # worker with its own seed derived from (seed, shard). The output only
+        # depends on seed and the shard count, which defaults to workers.
+        # Yields shard paths as they finish, in shard order unless ordered=False.
+        workers = workers or os.cpu_count() or 1
+        shards = shards or workers
+        tasks = []
+        for shard in range(shards):
+            size = count // shards + (1 if shard < count % shards else 0)
+            tasks.append((self, f"{prefix}-{shard:04d}.txt", size, shard_seed(seed, shard), options))
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.imap(write_shard, tasks) if ordered else pool.imap_unordered(write_shard, tasks)
+            yield from results
+
+    def sampler(self, seed=None):
+        return LanguageSampler(self.to_finite_automaton(), seed)
+
     def to_finite_automaton(self):
         states = set(self.VN) | {"q_accept"}
         alphabet = set(self.VT)
@@ -59,6 +165,15 @@ class Grammar:
 
         return "Type 2"
 
+def shard_seed(seed, shard):
+    digest = hashlib.sha256(f"{seed}:{shard}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def write_shard(task):
+    grammar, path, count, seed, options = task
+    grammar.write_strings(path, count, seed=seed, **options)
+    return path
+
 class FiniteAutomaton:
     def __init__(self, states, alphabet, transitions, start_state, final_states):
         self.states = states
@@ -78,6 +193,205 @@ class FiniteAutomaton:
         
         return current_state in self.final_states
 
+    def compile(self):
+        # The table is a snapshot: accepts_many keeps using it until compile()
+        # is called again, so call it after changing transitions or states.
+        self._compiled = CompiledAutomaton(self)
+        return self._compiled
+
+    def accepts_many(self, strings):
+        # List of bools, one per string, from the table of the last compile()
+        # (compiling on first use).
+        compiled = getattr(self, "_compiled", None)
+        if compiled is None:
+            compiled = self.compile()
+        return compiled.accepts_many(strings)
+
+class CompiledAutomaton:
+    # Dense integer form of a FiniteAutomaton. State 0 is the start state and
+    # the last row is a dead state; the last column catches symbols outside the
+    # alphabet, so every lookup is a plain table index.
+    def __init__(self, automaton):
+        state_names = [automaton.start_state]
+        state_names += sorted(s for s in automaton.states if s != automaton.start_state)
+        for (state, _), next_states in automaton.transitions.items():
+            for name in [state] + next_states[:1]:
+                if name not in state_names:
+                    state_names.append(name)
+        self.state_index = {name: i for i, name in enumerate(state_names)}
+        self.symbols = sorted(set(automaton.alphabet) | {symbol for _, symbol in automaton.transitions})
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self.dead = len(state_names)
+        self.unknown = len(self.symbols)
+        self.table = [[self.dead] * (self.unknown + 1) for _ in range(self.dead + 1)]
+        for (state, symbol), next_states in automaton.transitions.items():
+            if next_states:
+                self.table[self.state_index[state]][self.symbol_index[symbol]] = self.state_index[next_states[0]]
+        self.final = [name in automaton.final_states for name in state_names] + [False]
+
+        if np is not None:
+            self.np_table = np.array(self.table, dtype=np.int32)
+            self.np_final = np.array(self.final, dtype=bool)
+            self.np_codepoints = np.array([ord(symbol) for symbol in self.symbols], dtype=np.uint32)
+
+    def accepts(self, input_string):
+        table = self.table
+        symbol_index = self.symbol_index
+        unknown = self.unknown
+        dead = self.dead
+        state = 0
+        for symbol in input_string:
+            state = table[state][symbol_index.get(symbol, unknown)]
+            if state == dead:
+                return False
+        return self.final[state]
+
+    def accepts_many(self, strings):
+        strings = list(strings)
+        if np is None:
+            return [self.accepts(s) for s in strings]
+
+        result = np.zeros(len(strings), dtype=bool)
+        by_length = {}
+        for i, s in enumerate(strings):
+            by_length.setdefault(len(s), []).append(i)
+
+        for length, indices in by_length.items():
+            indices = np.array(indices, dtype=np.intp)
+            states = np.zeros(len(indices), dtype=np.int32)
+            if length:
+                codes = self._encode([strings[i] for i in indices], length)
+                for column in codes.T:
+                    states = self.np_table[states, column]
+            result[indices] = self.np_final[states]
+        return result.tolist()
+
+    def _encode(self, strings, length):
+        # One UTF-32 buffer for the whole group, then a sorted lookup maps each
+        # code point to its symbol column (or the unknown column).
+        codepoints = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32)
+        if self.symbols and all(len(symbol) == 1 for symbol in self.symbols):
+            columns = np.searchsorted(self.np_codepoints, codepoints)
+            columns = np.minimum(columns, self.unknown)
+            found = np.zeros(len(codepoints), dtype=bool)
+            in_range = columns < self.unknown
+            found[in_range] = self.np_codepoints[columns[in_range]] == codepoints[in_range]
+            columns[~found] = self.unknown
+        else:
+            columns = np.full(len(codepoints), self.unknown, dtype=np.intp)
+        return columns.reshape(len(strings), length)
+
+class LanguageSampler:
+    # Counts accepted strings per length on a determinized copy of the
+    # automaton: table[k][q] is the number of accepted strings of length k
+    # read from state q. Rows are cached, so after the first request for a
+    # length, sampling uniformly among its strings is a single O(n) walk.
+    def __init__(self, automaton, seed=None):
+        symbols = sorted(set(automaton.alphabet) | {symbol for _, symbol in automaton.transitions})
+        start = frozenset([automaton.start_state])
+        index = {start: 0}
+        subsets = [start]
+        self.delta = []
+        self.final = []
+        position = 0
+        while position < len(subsets):
+            subset = subsets[position]
+            row = []
+            for symbol in symbols:
+                target = frozenset(next_state for state in subset
+                                   for next_state in automaton.transitions.get((state, symbol), []))
+                if not target:
+                    continue
+                if target not in index:
+                    index[target] = len(subsets)
+                    subsets.append(target)
+                row.append((symbol, index[target]))
+            self.delta.append(row)
+            self.final.append(any(state in automaton.final_states for state in subset))
+            position += 1
+        self.table = [[1 if final else 0 for final in self.final]]
+        self.rng = random.Random(seed)
+
+    def _counts(self, length):
+        table = self.table
+        while len(table) <= length:
+            previous = table[-1]
+            table.append([sum(previous[target] for _, target in row) for row in self.delta])
+        return table[length]
+
+    def count(self, length):
+        return self._counts(length)[0]
+
+    def sample(self, length):
+        total = self.count(length)
+        if not total:
+            raise ValueError(f"The language has no strings of length {length}")
+        table = self.table
+        state = 0
+        output = []
+        for remaining in range(length - 1, -1, -1):
+            pick = self.rng.randrange(table[remaining + 1][state])
+            for symbol, target in self.delta[state]:
+                weight = table[remaining][target]
+                if pick < weight:
+                    output.append(symbol)
+                    state = target
+                    break
+                pick -= weight
+        return "".join(output)
+
+    def iter_samples(self, length, count=None):
+        produced = 0
+        while count is None or produced < count:
+            yield self.sample(length)
+            produced += 1
+
+    def shortlex(self, max_length=None):
+        # Length by length, each in lexicographic order. Branches that cannot
+        # complete to an accepted string are pruned with the count table. With
+        # no max_length, a finite language ends once len(delta) consecutive
+        # lengths are empty.
+        length = 0
+        empty_run = 0
+        while max_length is None or length <= max_length:
+            if self.count(length):
+                empty_run = 0
+                yield from self._enumerate_length(length)
+            else:
+                empty_run += 1
+                if max_length is None and empty_run > len(self.delta):
+                    return
+            length += 1
+
+    def _enumerate_length(self, length):
+        if length == 0:
+            yield ""
+            return
+        self._counts(length)
+        table = self.table
+        path = []
+        stack = [iter(self.delta[0])]
+        remaining = length
+        while stack:
+            for symbol, target in stack[-1]:
+                if not table[remaining - 1][target]:
+                    continue
+                if remaining == 1:
+                    path.append(symbol)
+                    yield "".join(path)
+                    path.pop()
+                    continue
+                path.append(symbol)
+                remaining -= 1
+                stack.append(iter(self.delta[target]))
+                break
+            else:
+                stack.pop()
+                if path:
+                    path.pop()
+                    remaining += 1
+
 class Main:
     @staticmethod
     def run():
@@ -97,5 +411,44 @@ class Main:
         user_input = input("Enter a string to check: ")
         print(f"Accepts '{user_input}'?:", finite_automaton.accepts(user_input))
 
+    @staticmethod
+    def benchmark(count=200000):
+        grammar_rules = {
+            "S": ["dA"],
+            "A": ["aB", "bA"],
+            "B": ["bC", "aB", "d"],
+            "C": ["cB"]
+        }
+        grammar = Grammar(VN={"S", "A", "B", "C"}, VT={"a", "b", "c", "d"}, P=grammar_rules, start_symbol="S")
+        finite_automaton = grammar.to_finite_automaton()
+        # Half generated (accepted) strings, half with one symbol flipped.
+        rng = random.Random(0)
+        pool = grammar.generate_multiple_strings(2000)
+        strings = []
+        for _ in range(count):
+            s = rng.choice(pool)
+            if rng.random() < 0.5:
+                i = rng.randrange(len(s))
+                s = s[:i] + rng.choice("abcd") + s[i + 1:]
+            strings.append(s)
+
+        start = time.perf_counter()
+        expected = [finite_automaton.accepts(s) for s in strings]
+        dict_time = time.perf_counter() - start
+
+        finite_automaton.compile()
+        start = time.perf_counter()
+        result = finite_automaton.accepts_many(strings)
+        batch_time = time.perf_counter() - start
+
+        assert result == expected
+        backend = "numpy" if np is not None else "pure python"
+        print(f"{count} strings, mean length {sum(map(len, strings)) / count:.1f}")
+        print(f"  dict walk:    {count / dict_time:,.0f} strings/s")
+        print(f"  accepts_many: {count / batch_time:,.0f} strings/s ({backend})")
+
 if __name__ == "__main__":
-    Main.run()
+    if "--bench" in sys.argv:
+        Main.benchmark()
+    else:
+        Main.run()
@@ -1,5 +1,13 @@
+import random
+import time
+from collections import OrderedDict, deque
+
 import graphviz
 
+# Optional instrumentation hook (see benchmarks/instrument.py). While None the
+# conversions only pay one global lookup per call.
+STATS = None
+
 class Automaton:
     def __init__(self, states, alphabet, transitions, start_state, final_states):
         self.states = states
@@ -31,64 +39,310 @@ class Automaton:
                 return False
         return True
 
+    def bitmask_tables(self):
+        # NFA states are interned as bit positions, so a set of states is a
+        # plain int bitmask and each NFA state contributes a precomputed
+        # successor mask per symbol.
+        nfa_states = sorted(self.states | {s for targets in self.transitions.values() for s in targets}
+                            | {s for s, _ in self.transitions} | {self.start_state})
+        index = {state: i for i, state in enumerate(nfa_states)}
+        symbols = sorted(self.alphabet)
+        symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+
+        successors = [{} for _ in nfa_states]
+        for (state, symbol), next_states in self.transitions.items():
+            if symbol not in symbol_index:
+                continue
+            mask = 0
+            for next_state in next_states:
+                mask |= 1 << index[next_state]
+            row = successors[index[state]]
+            row[symbol_index[symbol]] = row.get(symbol_index[symbol], 0) | mask
+        successors = [list(row.items()) for row in successors]
+
+        final_mask = 0
+        for state in self.final_states:
+            if state in index:
+                final_mask |= 1 << index[state]
+
+        return index, symbols, successors, final_mask
+
     def convert_to_dfa(self):
-        dfa_states = set()
+        stats = STATS
+        started = time.perf_counter() if stats is not None else None
+        index, symbols, successors, final_mask = self.bitmask_tables()
+        start_mask = 1 << index[self.start_state]
+        state_mapping = {start_mask: "q0"}
+        unprocessed_states = deque([start_mask])
         dfa_transitions = {}
-        dfa_start_state = frozenset([self.start_state])
         dfa_final_states = set()
-        unprocessed_states = [dfa_start_state]
-        state_mapping = {dfa_start_state: "q0"}
-        state_counter = 1
 
         while unprocessed_states:
-            current_state = unprocessed_states.pop()
-            dfa_states.add(current_state)
-            for symbol in self.alphabet:
-                next_state = frozenset(
-                    sum((self.transitions.get((sub_state, symbol), []) for sub_state in current_state), []))
-                if next_state:
-                    state_name = "q" + "".join(sorted(next_state)).replace("q", "")
-                    if next_state not in state_mapping:
-                        state_mapping[next_state] = state_name
-                        unprocessed_states.append(next_state)
-                    dfa_transitions[(state_mapping[current_state], symbol)] = [state_mapping[next_state]]
-
-        for state in dfa_states:
-            if any(sub_state in self.final_states for sub_state in state):
-                dfa_final_states.add(state_mapping[state])
+            current_mask = unprocessed_states.popleft()
+            current_name = state_mapping[current_mask]
+            if current_mask & final_mask:
+                dfa_final_states.add(current_name)
 
+            next_masks = successor_masks(current_mask, successors, len(symbols))
+            for symbol_id, next_mask in enumerate(next_masks):
+                if not next_mask:
+                    continue
+                next_name = state_mapping.get(next_mask)
+                if next_name is None:
+                    next_name = f"q{len(state_mapping)}"
+                    state_mapping[next_mask] = next_name
+                    unprocessed_states.append(next_mask)
+                dfa_transitions[(current_name, symbols[symbol_id])] = [next_name]
+
+        if stats is not None:
+            stats.record('convert_to_dfa', started, nfa_states=len(index),
+                         states_explored=len(state_mapping), transitions_built=len(dfa_transitions))
         return Automaton(
             states=set(state_mapping.values()),
             alphabet=self.alphabet,
             transitions=dfa_transitions,
-            start_state=state_mapping[dfa_start_state],
+            start_state="q0",
             final_states=dfa_final_states,
         )
 
-    def visualize(self, is_nfa=True):
-        dot = graphviz.Digraph(format='png', engine='dot')
+    def minimize(self, report=False):
+        # Hopcroft's partition refinement. Missing transitions go to an
+        # implicit sink, which also absorbs every state that cannot reach a
+        # final state; its block is dropped again so the result stays partial.
+        dfa = self if self.is_deterministic() else self.convert_to_dfa()
+        symbols = sorted(dfa.alphabet | {symbol for _, symbol in dfa.transitions})
 
-        for state in self.states:
-            if state == self.start_state:
-                dot.node(state, shape='ellipse', style='filled', fillcolor='lightblue', label=f"start\n{state}")
-            elif state in self.final_states:
-                dot.node(state, shape='doublecircle', label=f"final\n{state}")
-            else:
-                dot.node(state, shape='ellipse', label=state)
+        index = {dfa.start_state: 0}
+        names = [dfa.start_state]
+        delta = []
+        position = 0
+        while position < len(names):
+            state = names[position]
+            row = []
+            for symbol in symbols:
+                next_states = dfa.transitions.get((state, symbol))
+                if not next_states:
+                    row.append(None)
+                    continue
+                if next_states[0] not in index:
+                    index[next_states[0]] = len(names)
+                    names.append(next_states[0])
+                row.append(index[next_states[0]])
+            delta.append(row)
+            position += 1
+
+        sink = len(names)
+        inverse = [[[] for _ in range(sink + 1)] for _ in symbols]
+        for state, row in enumerate(delta):
+            for symbol_id, target in enumerate(row):
+                inverse[symbol_id][sink if target is None else target].append(state)
+        for symbol_id in range(len(symbols)):
+            inverse[symbol_id][sink].append(sink)
+
+        final = {i for i, name in enumerate(names) if name in dfa.final_states}
+        blocks = [set(final), set(range(sink + 1)) - final]
+        blocks = [block for block in blocks if block]
+        block_of = [0] * (sink + 1)
+        for block_id, block in enumerate(blocks):
+            for state in block:
+                block_of[state] = block_id
+
+        smallest = min(range(len(blocks)), key=lambda b: len(blocks[b]))
+        worklist = {(smallest, symbol_id) for symbol_id in range(len(symbols))}
+        while worklist:
+            splitter, symbol_id = worklist.pop()
+            predecessors = {}
+            for target in list(blocks[splitter]):
+                for state in inverse[symbol_id][target]:
+                    predecessors.setdefault(block_of[state], set()).add(state)
+
+            for block_id, moved in predecessors.items():
+                block = blocks[block_id]
+                if len(moved) == len(block):
+                    continue
+                block -= moved
+                if len(block) < len(moved):
+                    blocks[block_id], moved = moved, block
+                new_id = len(blocks)
+                blocks.append(moved)
+                for state in moved:
+                    block_of[state] = new_id
+                for other_symbol in range(len(symbols)):
+                    worklist.add((new_id, other_symbol))
+
+        dead_block = block_of[sink]
+        block_names = {}
+        min_transitions = {}
+        min_final_states = set()
+        queue = deque([block_of[0]])
+        block_names[block_of[0]] = "q0"
+        while queue:
+            block_id = queue.popleft()
+            representative = next(iter(blocks[block_id]))
+            if representative in final:
+                min_final_states.add(block_names[block_id])
+            if block_id == dead_block:
+                continue
+            for symbol_id, target in enumerate(delta[representative]):
+                if target is None or block_of[target] == dead_block:
+                    continue
+                target_block = block_of[target]
+                if target_block not in block_names:
+                    block_names[target_block] = f"q{len(block_names)}"
+                    queue.append(target_block)
+                min_transitions[(block_names[block_id], symbols[symbol_id])] = [block_names[target_block]]
 
+        minimized = Automaton(
+            states=set(block_names.values()),
+            alphabet=self.alphabet,
+            transitions=min_transitions,
+            start_state="q0",
+            final_states=min_final_states,
+        )
+        if report:
+            print(f"Minimized DFA: {len(dfa.states)} -> {len(minimized.states)} states")
+        return minimized
+
+    def lazy_matcher(self, max_states=1024):
+        return LazyDFA(self, max_states)
+
+    def write_dot(self, out, max_states=None, sample=None, seed=0):
+        # Streams DOT text to a path or text file, breadth-first from the
+        # start state, without building a graphviz.Digraph. Parallel
+        # transitions are merged into one labelled edge. At most max_states
+        # states are drawn; with sample, a transition to a state not yet
+        # drawn is followed with that probability. Transitions left out
+        # either way point to one "..." node. Returns the number of states
+        # written.
+        outgoing = {}
         for (state, symbol), next_states in self.transitions.items():
+            targets = outgoing.setdefault(state, {})
             for next_state in next_states:
-                if is_nfa:
-                    dot.edge(state, next_state, label=symbol)
+                targets.setdefault(next_state, []).append(symbol)
+
+        file = open(out, 'w', encoding='utf-8') if isinstance(out, str) else out
+        rng = random.Random(seed)
+        write = file.write
+        ids = {self.start_state: "s0"}
+        queue = deque([self.start_state])
+        unreachable = iter(sorted(self.states))
+        omitted = False
+        try:
+            write("digraph {\n")
+            while queue or sample is None:
+                if not queue:
+                    # Unreachable states are drawn last, budget permitting,
+                    # unless sampling.
+                    state = next((s for s in unreachable if s not in ids), None)
+                    if state is None or (max_states is not None and len(ids) >= max_states):
+                        break
+                    ids[state] = f"s{len(ids)}"
+                    queue.append(state)
+                state = queue.popleft()
+                node_id = ids[state]
+                if state == self.start_state:
+                    label = dot_quote("start\n" + state)
+                    write(f'  {node_id} [shape=ellipse, style=filled, fillcolor=lightblue, label={label}];\n')
+                elif state in self.final_states:
+                    label = dot_quote("final\n" + state)
+                    write(f'  {node_id} [shape=doublecircle, label={label}];\n')
                 else:
-                    dot.edge(state, next_state, label=symbol)
+                    write(f'  {node_id} [shape=ellipse, label={dot_quote(state)}];\n')
+                for next_state, symbols in outgoing.get(state, {}).items():
+                    target_id = ids.get(next_state)
+                    if target_id is None:
+                        full = max_states is not None and len(ids) >= max_states
+                        if full or (sample is not None and rng.random() >= sample):
+                            omitted = True
+                            target_id = "omitted"
+                        else:
+                            target_id = f"s{len(ids)}"
+                            ids[next_state] = target_id
+                            queue.append(next_state)
+                    write(f'  {node_id} -> {target_id} [label={dot_quote(",".join(sorted(symbols)))}];\n')
+            if omitted:
+                write('  omitted [shape=note, label="..."];\n')
+            write("}\n")
+        finally:
+            if file is not out:
+                file.close()
+        return len(ids)
+
+    def visualize(self, is_nfa=True, max_states=None):
+        name = 'nfa_automaton' if is_nfa else 'dfa_automaton'
+        self.write_dot(name, max_states=max_states)
+        graphviz.render('dot', 'png', name)
+        print(f"{'NFA' if is_nfa else 'DFA'} Graph generated as '{name}.png'")
+
+def dot_quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+def successor_masks(mask, successors, symbol_count):
+    next_masks = [0] * symbol_count
+    while mask:
+        low_bit = mask & -mask
+        for symbol_id, successor_mask in successors[low_bit.bit_length() - 1]:
+            next_masks[symbol_id] |= successor_mask
+        mask ^= low_bit
+    return next_masks
 
-        if is_nfa:
-            dot.render('nfa_automaton')  
-            print("NFA Graph generated as 'nfa_automaton.png'")
-        else:
-            dot.render('dfa_automaton')  
-            print("DFA Graph generated as 'dfa_automaton.png'")
+class LazyDFA:
+    # Simulates the NFA directly and determinizes only the subsets the input
+    # actually reaches. Each cached DFA state maps a symbol to the next subset
+    # mask; at most max_states of them are kept, least recently used first out.
+    def __init__(self, automaton, max_states=1024):
+        if max_states < 1:
+            raise ValueError("max_states must be at least 1")
+        index, symbols, self.successors, self.final_mask = automaton.bitmask_tables()
+        self.symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.start_mask = 1 << index[automaton.start_state]
+        self.max_states = max_states
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _row(self, mask):
+        row = self.cache.get(mask)
+        if row is not None:
+            self.hits += 1
+            self.cache.move_to_end(mask)
+            return row
+        self.misses += 1
+        row = successor_masks(mask, self.successors, len(self.symbol_index))
+        self.cache[mask] = row
+        if len(self.cache) > self.max_states:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+        return row
+
+    def accepts(self, input_string):
+        symbol_index = self.symbol_index
+        mask = self.start_mask
+        row = None
+        for symbol in input_string:
+            symbol_id = symbol_index.get(symbol)
+            if symbol_id is None:
+                return False
+            if row is None:
+                row = self._row(mask)
+            else:
+                self.hits += 1
+            next_mask = row[symbol_id]
+            if not next_mask:
+                return False
+            if next_mask != mask:
+                mask = next_mask
+                row = None
+        return bool(mask & self.final_mask)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "cached_states": len(self.cache),
+        }
 
 def main():
     states = {"q0", "q1", "q2", "q3"}
@@ -129,6 +383,8 @@ def main():
     print("DFA Start State:", dfa.start_state)
     print("DFA Final States:", dfa.final_states)
 
+    dfa.minimize(report=True)
+
     dfa.visualize(is_nfa=False)
 
 if __name__ == "__main__":
@@ -1,39 +1,438 @@
+import os
 import random
 import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+import labs
+
+# The lab's regex dialect: literals, groups, '|', and the postfix operators
+# '+', '*', '?' and '^n' (exactly n times), which bind to the atom or group
+# before them and may be stacked. '\' makes the next character a literal.
+# A pattern is parsed once into a tree of RegexNode; RegexGenerator then
+# compiles the tree into nested closures, so generating a string never looks
+# at the pattern text again.
+
+OPERATORS = '()|+*?^\\'
+
+class RegexNode:
+    # kind is 'literal' (value holds the text), 'concat' or 'alternation'
+    # (children), or 'repeat' (one child, low..high with high None for
+    # unbounded). text is the pattern source of the node, used for tracing.
+    __slots__ = ('kind', 'children', 'value', 'low', 'high', 'text')
+
+    def __init__(self, kind, children=(), value='', low=1, high=1, text=''):
+        self.kind = kind
+        self.children = list(children)
+        self.value = value
+        self.low = low
+        self.high = high
+        self.text = text
+
+    def __repr__(self):
+        if self.kind == 'literal':
+            return f"literal({self.value!r})"
+        if self.kind == 'repeat':
+            return f"repeat({self.children[0]!r}, {self.low}, {self.high})"
+        return f"{self.kind}({', '.join(map(repr, self.children))})"
+
+class RegexParser:
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+
+    def parse(self):
+        node = self.parse_alternation()
+        if self.pos < len(self.pattern):
+            raise ValueError(f"Unbalanced ')' at position {self.pos} in {self.pattern!r}")
+        return node
+
+    def parse_alternation(self):
+        start = self.pos
+        options = [self.parse_concat()]
+        while self.peek() == '|':
+            self.pos += 1
+            options.append(self.parse_concat())
+        if len(options) == 1:
+            return options[0]
+        return RegexNode('alternation', options, text=self.pattern[start:self.pos])
+
+    def parse_concat(self):
+        start = self.pos
+        items = []
+        while self.peek() not in (None, '|', ')'):
+            item = self.parse_repeat()
+            if item.kind == 'literal' and items and items[-1].kind == 'literal':
+                previous = items.pop()
+                item = RegexNode('literal', value=previous.value + item.value, text=previous.text + item.text)
+            items.append(item)
+        if len(items) == 1:
+            return items[0]
+        if not items:
+            return RegexNode('literal')
+        return RegexNode('concat', items, text=self.pattern[start:self.pos])
+
+    def parse_repeat(self):
+        start = self.pos
+        node = self.parse_atom()
+        while True:
+            char = self.peek()
+            if char == '+':
+                low, high = 1, None
+            elif char == '*':
+                low, high = 0, None
+            elif char == '?':
+                low, high = 0, 1
+            elif char == '^':
+                digits_start = self.pos + 1
+                end = digits_start
+                while end < len(self.pattern) and self.pattern[end].isdigit():
+                    end += 1
+                if end == digits_start:
+                    raise ValueError(f"Expected a count after '^' at position {self.pos} in {self.pattern!r}")
+                low = high = int(self.pattern[digits_start:end])
+                self.pos = end - 1
+            else:
+                return node
+            self.pos += 1
+            node = RegexNode('repeat', [node], low=low, high=high, text=self.pattern[start:self.pos])
+
+    def parse_atom(self):
+        char = self.peek()
+        start = self.pos
+        if char == '(':
+            self.pos += 1
+            node = self.parse_alternation()
+            if self.peek() != ')':
+                raise ValueError(f"Missing ')' for '(' at position {start} in {self.pattern!r}")
+            self.pos += 1
+            if node.kind == 'alternation' or node.kind == 'concat':
+                node.text = self.pattern[start:self.pos]
+            return node
+        if char == '\\':
+            if self.pos + 1 >= len(self.pattern):
+                raise ValueError(f"Dangling '\\' at the end of {self.pattern!r}")
+            self.pos += 2
+            return RegexNode('literal', value=self.pattern[start + 1], text=self.pattern[start:self.pos])
+        if char in OPERATORS:
+            raise ValueError(f"Unexpected {char!r} at position {self.pos} in {self.pattern!r}")
+        self.pos += 1
+        return RegexNode('literal', value=char, text=char)
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+def parse_regex(pattern):
+    return RegexParser(pattern).parse()
+
+class RegexGenerator:
+    # Compiled once, reusable for any number of strings. Unbounded
+    # repetitions ('+', '*') are capped at max_repeats. generate() runs a
+    # program with no tracing code in it at all; trace() runs a separately
+    # compiled program that also records every choice as a step.
+
+    # Largest total size, in characters, of the precomputed strings for a
+    # repeated literal with a range of counts.
+    REPEAT_TABLE_CHARS = 1 << 16
+
+    def __init__(self, pattern, max_repeats=5, seed=None):
+        self.pattern = pattern
+        self.max_repeats = max_repeats
+        self.tree = parse_regex(pattern)
+        self.random = random.Random(seed) if seed is not None else random
+        self.program = self._compile(self.tree, None)
+        self.traced_program = None
+
+    def generate(self):
+        return self.program()
+
+    def generate_many(self, count):
+        program = self.program
+        return [program() for _ in range(count)]
+
+    def trace(self):
+        if self.traced_program is None:
+            self.steps = []
+            self.traced_program = self._compile(self.tree, self.steps)
+        self.steps.clear()
+        result = self.traced_program()
+        return result, list(self.steps)
+
+    def _bounds(self, node):
+        return node.low, self.max_repeats if node.high is None else node.high
+
+    def _compile(self, node, steps):
+        # Returns a zero-argument function producing one string.
+        if node.kind == 'literal':
+            value = node.value
+            return lambda: value
+        rng = self.random
+
+        if node.kind == 'concat':
+            parts = [self._compile(child, steps) for child in node.children]
+            if len(parts) == 2:
+                first, second = parts
+                return lambda: first() + second()
+            return lambda: ''.join([part() for part in parts])
+
+        if node.kind == 'alternation':
+            choices = [child.text for child in node.children]
+            if all(child.kind == 'literal' for child in node.children):
+                values = [child.value for child in node.children]
+                if steps is None:
+                    # random() scaled by hand is several times cheaper than
+                    # choice() and randint().
+                    uniform, size = rng.random, len(values)
+                    return lambda: values[int(uniform() * size)]
+
+                def traced():
+                    chosen = rng.choice(values)
+                    steps.append(f"Chose from {choices} -> {chosen}")
+                    return chosen
+                return traced
+
+            options = [self._compile(child, steps) for child in node.children]
+            if steps is None:
+                uniform, size = rng.random, len(options)
+                return lambda: options[int(uniform() * size)]()
+
+            def traced():
+                index = rng.randrange(len(options))
+                steps.append(f"Chose from {choices} -> {choices[index]}")
+                return options[index]()
+            return traced
+
+        low, high = self._bounds(node)
+        child = node.children[0]
+        text = node.text
+        if child.kind == 'literal':
+            literal = child.value
+            if low == high:
+                value = literal * low
+                if steps is None:
+                    return lambda: value
+
+                def traced():
+                    steps.append(f"Expanding {text} -> {value}")
+                    return value
+                return traced
+            if steps is None:
+                uniform, size = rng.random, high - low + 1
+                # Every repetition count is precomputed only while that table
+                # stays small; it grows with the square of high.
+                if len(literal) * (high + low) * size // 2 <= self.REPEAT_TABLE_CHARS:
+                    repeated = [literal * count for count in range(low, high + 1)]
+                    return lambda: repeated[int(uniform() * size)]
+                return lambda: literal * (low + int(uniform() * size))
+
+            def traced():
+                value = literal * rng.randint(low, high)
+                steps.append(f"Expanding {text} -> {value}")
+                return value
+            return traced
+
+        body = self._compile(child, steps)
+        if steps is None:
+            if low == high:
+                return lambda: ''.join([body() for _ in range(low)])
+            uniform, size = rng.random, high - low + 1
+            return lambda: ''.join([body() for _ in range(low + int(uniform() * size))])
+
+        def traced():
+            count = rng.randint(low, high)
+            steps.append(f"Expanding {text} {count} time(s)")
+            return ''.join([body() for _ in range(count)])
+        return traced
+
+class ThompsonNFA:
+    # Thompson's construction: every node becomes a fragment with one entry
+    # and one exit state glued together by epsilon edges (symbol None).
+    # '^n' and other bounded repeats are unrolled into copies of the child
+    # fragment; '+' and '*' are unbounded here, unlike in the generator.
+    def __init__(self, tree):
+        self.edges = []
+        self.state_count = 0
+        self.alphabet = set()
+        self.start, self.accept = self.fragment(tree)
+
+    def new_state(self):
+        self.state_count += 1
+        return self.state_count - 1
+
+    def fragment(self, node):
+        start = self.new_state()
+        if node.kind == 'literal':
+            current = start
+            for char in node.value:
+                following = self.new_state()
+                self.edges.append((current, char, following))
+                self.alphabet.add(char)
+                current = following
+            return start, current
+        if node.kind == 'concat':
+            current = start
+            for child in node.children:
+                child_start, child_accept = self.fragment(child)
+                self.edges.append((current, None, child_start))
+                current = child_accept
+            return start, current
+        if node.kind == 'alternation':
+            accept = self.new_state()
+            for child in node.children:
+                child_start, child_accept = self.fragment(child)
+                self.edges.append((start, None, child_start))
+                self.edges.append((child_accept, None, accept))
+            return start, accept
+
+        child = node.children[0]
+        current = start
+        for _ in range(node.low):
+            child_start, child_accept = self.fragment(child)
+            self.edges.append((current, None, child_start))
+            current = child_accept
+        if node.high is None:
+            child_start, child_accept = self.fragment(child)
+            accept = self.new_state()
+            self.edges.append((current, None, child_start))
+            self.edges.append((current, None, accept))
+            self.edges.append((child_accept, None, child_start))
+            self.edges.append((child_accept, None, accept))
+            return start, accept
+        accept = self.new_state()
+        for _ in range(node.high - node.low):
+            self.edges.append((current, None, accept))
+            child_start, child_accept = self.fragment(child)
+            self.edges.append((current, None, child_start))
+            current = child_accept
+        self.edges.append((current, None, accept))
+        return start, accept
+
+    def to_automaton(self):
+        # lab-2 automata have no epsilon moves, so they are folded away: a
+        # state gets the symbol edges of its whole epsilon closure and is
+        # final when the closure reaches the accept state. Only states
+        # reachable from the start are kept.
+        epsilon = [[] for _ in range(self.state_count)]
+        moves = [[] for _ in range(self.state_count)]
+        for source, symbol, target in self.edges:
+            (epsilon if symbol is None else moves)[source].append((symbol, target))
+
+        def closure(state):
+            seen = {state}
+            stack = [state]
+            while stack:
+                for _, target in epsilon[stack.pop()]:
+                    if target not in seen:
+                        seen.add(target)
+                        stack.append(target)
+            return seen
+
+        transitions = {}
+        final_states = set()
+        states = {f"n{self.start}"}
+        queue = [self.start]
+        while queue:
+            state = queue.pop()
+            name = f"n{state}"
+            reached = closure(state)
+            if self.accept in reached:
+                final_states.add(name)
+            for member in reached:
+                for symbol, target in moves[member]:
+                    targets = transitions.setdefault((name, symbol), [])
+                    target_name = f"n{target}"
+                    if target_name not in targets:
+                        targets.append(target_name)
+                    if target_name not in states:
+                        states.add(target_name)
+                        queue.append(target)
+
+        Automaton = labs.lab2().Automaton
+        return Automaton(states, set(self.alphabet), transitions, f"n{self.start}", final_states)
+
+def regex_to_automaton(pattern):
+    return ThompsonNFA(parse_regex(pattern)).to_automaton()
+
+class RegexMatcher:
+    # Full-match checker: Thompson NFA -> lab-2 convert_to_dfa -> minimize ->
+    # one dict of transitions per state. Matching reads each character once
+    # and never backtracks, so it is linear in the input whatever the
+    # pattern.
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.nfa = regex_to_automaton(pattern)
+        dfa = self.nfa.convert_to_dfa().minimize()
+        names = [dfa.start_state] + sorted(dfa.states - {dfa.start_state})
+        index = {name: i for i, name in enumerate(names)}
+        self.rows = [{} for _ in names]
+        for (state, symbol), next_states in dfa.transitions.items():
+            self.rows[index[state]][symbol] = index[next_states[0]]
+        self.final = [name in dfa.final_states for name in names]
+
+    def matches(self, text):
+        rows = self.rows
+        state = 0
+        for char in text:
+            state = rows[state].get(char)
+            if state is None:
+                return False
+        return self.final[state]
+
+def to_python_regex(pattern):
+    # The same language in Python re syntax, for cross-checks and benchmarks.
+    # Written out from the parsed tree with every repeated operand in its own
+    # group, so stacked operators cannot turn into re's lazy or possessive
+    # suffixes ('a^2?' is (?:(?:a){2})?, not the lazy a{2}?).
+    return python_regex(parse_regex(pattern))
+
+def python_regex(node):
+    if node.kind == 'literal':
+        return re.escape(node.value)
+    if node.kind == 'concat':
+        return ''.join(python_regex(child) for child in node.children)
+    if node.kind == 'alternation':
+        return '(?:' + '|'.join(python_regex(child) for child in node.children) + ')'
+    if node.low == node.high:
+        count = f'{{{node.low}}}'
+    else:
+        count = f"{{{node.low},{'' if node.high is None else node.high}}}"
+    child = node.children[0]
+    body = python_regex(child)
+    return f'{body}{count}' if child.kind == 'alternation' else f'(?:{body}){count}'
 
 def generate_from_regex(regex, max_repeats=5):
-    steps = []
-    
-    def expand(pattern):
-        if '|' in pattern:
-            options = re.findall(r'\((.*?)\)', pattern)
-            for option in options:
-                choices = option.split('|')
-                chosen = random.choice(choices)
-                pattern = pattern.replace(f'({option})', chosen, 1)
-                steps.append(f"Chose from {choices} -> {chosen}")
-        
-        pattern = re.sub(r'(\w)\+', lambda m: (
-            steps.append(f"Expanding {m.group(1)}+ -> {m.group(1) * random.randint(1, max_repeats)}") 
-            or m.group(1) * random.randint(1, max_repeats)), pattern)
-        
-        pattern = re.sub(r'(\w)\*', lambda m: (
-            steps.append(f"Expanding {m.group(1)}* -> {m.group(1) * random.randint(0, max_repeats)}") 
-            or m.group(1) * random.randint(0, max_repeats)), pattern)
-        
-        pattern = re.sub(r'(\w)\?', lambda m: (
-            steps.append(f"Expanding {m.group(1)}? -> {m.group(1) if random.choice([True, False]) else ''}") 
-            or (m.group(1) if random.choice([True, False]) else '')), pattern)
-        
-        pattern = re.sub(r'(\w)\^(\d+)', lambda m: (
-            steps.append(f"Expanding {m.group(1)}^{m.group(2)} -> {m.group(1) * int(m.group(2))}") 
-            or m.group(1) * int(m.group(2))), pattern)
-
-        return pattern
-    
-    result = expand(regex)
-
-    return result, steps
+    generator = RegexGenerator(regex, max_repeats)
+    return generator.trace()
+
+def benchmark(count=1000000):
+    for regex in regexes:
+        generator = RegexGenerator(regex, seed=0)
+        start = time.perf_counter()
+        generator.generate_many(count)
+        elapsed = time.perf_counter() - start
+        print(f"{regex}: {count} strings in {elapsed:.2f}s ({count / elapsed:,.0f} strings/s)")
+
+def benchmark_matcher(length=1000000):
+    cases = [
+        ("(a|b)*abb", "ab" * (length // 2 - 2) + "aabb"),
+        ("J+K(L|M|N)*O?(P|Q)^3", "J" * (length // 2) + "K" + "LMN" * (length // 6) + "PQP"),
+        ("(a|aa)*c", "a" * 26),
+        ("(a*)*b", "a" * 26),
+    ]
+    for pattern, text in cases:
+        matcher = RegexMatcher(pattern)
+        compiled = re.compile(to_python_regex(pattern))
+        start = time.perf_counter()
+        ours = matcher.matches(text)
+        ours_time = time.perf_counter() - start
+        start = time.perf_counter()
+        theirs = compiled.fullmatch(text) is not None
+        theirs_time = time.perf_counter() - start
+        assert ours == theirs
+        print(f"{pattern:22} {len(text):>8} chars  table DFA {ours_time:.4f}s  re {theirs_time:.4f}s  match={ours}")
 
 regexes = [
     "O(P|Q|R)+2(3|4)",
@@ -41,11 +440,13 @@ regexes = [
     "J+K(L|M|N)*O?(P|Q)^3"
 ]
 
-for regex in regexes:
-    print(f"\nProcessing Regex: {regex}")
-    result, steps = generate_from_regex(regex)
-    
-    for step in steps:
-        print(" -", step)
-    
-    print(f"Generated String: {result}\n")
+if __name__ == "__main__":
+    for regex in regexes:
+        print(f"\nProcessing Regex: {regex}")
+        result, steps = generate_from_regex(regex)
+
+        for step in steps:
+            print(" -", step)
+
+        print(f"Generated String: {result}")
+        print(f"Matches {regex}: {RegexMatcher(regex).matches(result)}\n")
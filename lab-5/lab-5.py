@@ -1,22 +1,98 @@
 import string
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Optional instrumentation hook (see benchmarks/instrument.py), checked once
+# per normalization stage.
+STATS = None
+
+class SymbolTable:
+    # Interns every terminal and nonterminal as a small integer. Right-hand
+    # sides are tuples of these ids; names are only needed for display.
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.is_variable = []
+        self.fresh_counter = 0
+
+    def intern(self, name, variable):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            self.ids[name] = symbol
+            self.names.append(name)
+            self.is_variable.append(variable)
+        return symbol
+
+    def fresh_variable(self):
+        # Names run A..Z, AA..ZZ, AAA.. and so on; the counter only moves
+        # forward, so skipping names already taken is amortized O(1).
+        while True:
+            n = self.fresh_counter
+            self.fresh_counter += 1
+            name = ''
+            while True:
+                name = string.ascii_uppercase[n % 26] + name
+                n = n // 26 - 1
+                if n < 0:
+                    break
+            if name not in self.ids:
+                return self.intern(name, True)
+
+    def to_string(self, rhs):
+        if not rhs:
+            return 'ε'
+        names = [self.names[symbol] for symbol in rhs]
+        return ''.join(names) if all(len(name) == 1 for name in names) else ' '.join(names)
 
 class CFG:
+    # productions maps a variable name to its right-hand sides. A string
+    # right-hand side has one symbol per character ('ε' is the empty one);
+    # any other sequence is a list of symbol names. A name is a variable if
+    # it has productions or is upper case.
+    CNF_STAGES = {
+        'START': 'add_new_start',
+        'TERM': 'replace_terminals_in_rules',
+        'BIN': 'replace_long_productions',
+        'DEL': 'eliminate_epsilon_productions',
+        'UNIT': 'eliminate_unit_productions',
+        'CLEAN': 'eliminate_useless_symbols',
+    }
+    # Binarizing before DEL keeps every right-hand side at two symbols, so
+    # DEL adds at most three rules per rule instead of 2^k; the result is
+    # polynomial in the size of the input grammar.
+    CNF_ORDER = ('START', 'TERM', 'BIN', 'DEL', 'UNIT', 'CLEAN')
+
     def __init__(self, productions, start_symbol):
-        self.productions = productions
-        self.start_symbol = start_symbol
-        self.used_variables = set(productions.keys())
+        self.symbols = SymbolTable()
+        for lhs in productions:
+            self.symbols.intern(lhs, True)
+        self.start_symbol = self.symbols.intern(start_symbol, True)
+        self.productions = {}
+        for lhs, rhs_list in productions.items():
+            self.productions[self.symbols.ids[lhs]] = [self.intern_rhs(rhs) for rhs in rhs_list]
+        self.used_variables = set(self.productions)
         self.terminal_to_variable = {}
 
+    def intern_rhs(self, rhs):
+        if rhs == 'ε':
+            return ()
+        ids = self.symbols.ids
+        return tuple(ids[name] if name in ids else self.symbols.intern(name, name.isupper()) for name in rhs)
+
     def generate_new_variable(self):
-        for letter in string.ascii_uppercase:
-            if letter not in self.used_variables:
-                self.used_variables.add(letter)
-                return letter
-        for i in range(26, 702):
-            var = string.ascii_uppercase[i // 26 - 1] + string.ascii_uppercase[i % 26]
-            if var not in self.used_variables:
-                self.used_variables.add(var)
-                return var
+        variable = self.symbols.fresh_variable()
+        self.used_variables.add(variable)
+        return variable
+
+    def add_new_start(self):
+        start = self.generate_new_variable()
+        self.productions = {start: [(self.start_symbol,)], **self.productions}
+        self.start_symbol = start
 
     def eliminate_epsilon_productions(self):
         nullable_variables = self.find_nullable_variables()
@@ -25,77 +101,136 @@ class CFG:
             new_productions[lhs] = set()
             for rhs in self.productions[lhs]:
                 self.generate_new_productions(lhs, rhs, nullable_variables, new_productions)
-        self.productions = {lhs: [rhs for rhs in rhs_list if rhs != 'ε']
-                            for lhs, rhs_list in new_productions.items()}
+        # The empty string stays in the language through start -> ε, which is
+        # allowed in CNF as long as the start symbol is never on a right side.
+        if self.start_symbol in nullable_variables and self.start_symbol in new_productions and \
+                not any(self.start_symbol in rhs for rhs_list in self.productions.values() for rhs in rhs_list):
+            new_productions[self.start_symbol].add(())
+        self.productions = {lhs: list(rhs_set) for lhs, rhs_set in new_productions.items()}
+
+    def index(self):
+        # Flat rule list plus a reverse index from each variable to the rules
+        # whose right-hand side mentions it, once per occurrence.
+        is_variable = self.symbols.is_variable
+        rules = []
+        occurrences = {}
+        for lhs, rhs_list in self.productions.items():
+            for rhs in rhs_list:
+                rule_id = len(rules)
+                rules.append((lhs, rhs))
+                for symbol in rhs:
+                    if is_variable[symbol]:
+                        occurrences.setdefault(symbol, []).append(rule_id)
+        return rules, occurrences
+
+    def propagate(self, rules, occurrences, remaining):
+        # Marks the lhs of every rule whose counter drops to zero. Marking a
+        # symbol decrements the counter of each rule it occurs in, so every
+        # occurrence is visited at most once.
+        marked = set()
+        worklist = [rules[rule_id][0] for rule_id, count in enumerate(remaining) if count == 0]
+        while worklist:
+            symbol = worklist.pop()
+            if symbol in marked:
+                continue
+            marked.add(symbol)
+            for rule_id in occurrences.get(symbol, ()):
+                remaining[rule_id] -= 1
+                if remaining[rule_id] == 0:
+                    worklist.append(rules[rule_id][0])
+        return marked
 
     def find_nullable_variables(self):
-        nullable = set()
-        for lhs in self.productions:
-            for rhs in self.productions[lhs]:
-                if rhs == 'ε':
-                    nullable.add(lhs)
-        changed = True
-        while changed:
-            changed = False
-            for lhs in self.productions:
-                for rhs in self.productions[lhs]:
-                    if all(symbol in nullable for symbol in rhs if symbol.isupper()) and lhs not in nullable:
-                        nullable.add(lhs)
-                        changed = True
-        return nullable
+        is_variable = self.symbols.is_variable
+        rules, occurrences = self.index()
+        remaining = []
+        for lhs, rhs in rules:
+            if all(is_variable[symbol] for symbol in rhs):
+                remaining.append(len(rhs))
+            else:
+                # A terminal can never vanish; counting down from -1 never
+                # reaches zero.
+                remaining.append(-1)
+        return self.propagate(rules, occurrences, remaining)
+
+    def find_productive_variables(self):
+        is_variable = self.symbols.is_variable
+        rules, occurrences = self.index()
+        remaining = [sum(is_variable[symbol] for symbol in rhs) for _, rhs in rules]
+        return self.propagate(rules, occurrences, remaining)
+
+    def find_reachable_variables(self):
+        is_variable = self.symbols.is_variable
+        reachable = {self.start_symbol}
+        worklist = [self.start_symbol]
+        while worklist:
+            symbol = worklist.pop()
+            for rhs in self.productions.get(symbol, []):
+                for child in rhs:
+                    if is_variable[child] and child not in reachable:
+                        reachable.add(child)
+                        worklist.append(child)
+        return reachable
 
     def generate_new_productions(self, lhs, rhs, nullable_variables, new_productions):
-        rhs_list = list(rhs)
-        nullable_indices = [i for i, symbol in enumerate(rhs_list) if symbol in nullable_variables]
+        nullable_indices = [i for i, symbol in enumerate(rhs) if symbol in nullable_variables]
         num_nullable = len(nullable_indices)
         if num_nullable == 0:
-            new_productions[lhs].add(rhs)
+            if rhs:
+                new_productions[lhs].add(rhs)
         else:
             for i in range(1 << num_nullable):
-                new_rhs = list(rhs_list)
-                for j, idx in enumerate(nullable_indices):
-                    if (i >> j) & 1 == 0:
-                        new_rhs[idx] = ''
-                new_rhs = ''.join(new_rhs).replace('', '')
-                if new_rhs != '':
+                dropped = {idx for j, idx in enumerate(nullable_indices) if (i >> j) & 1 == 0}
+                new_rhs = tuple(symbol for k, symbol in enumerate(rhs) if k not in dropped)
+                if new_rhs:
                     new_productions[lhs].add(new_rhs)
 
-    def eliminate_unit_productions(self):
-        unit_productions = {}
+    def is_unit(self, rhs):
+        return len(rhs) == 1 and self.symbols.is_variable[rhs[0]]
+
+    def unit_closure(self):
+        # For each variable, every variable reachable through unit rules
+        # (itself included), found by a search over the unit-rule graph.
+        unit_targets = {lhs: [rhs[0] for rhs in rhs_list if self.is_unit(rhs)]
+                        for lhs, rhs_list in self.productions.items()}
+        closure = {}
         for lhs in self.productions:
-            unit_productions[lhs] = set()
-            for rhs in self.productions[lhs]:
-                if len(rhs) == 1 and rhs.isupper():
-                    unit_productions[lhs].add(rhs)
-        visited = set()
-        changes = True
-        while changes:
-            changes = False
-            for lhs in list(unit_productions.keys()):
-                if lhs in visited:
-                    continue
-                visited.add(lhs)
-                for rhs in list(unit_productions[lhs]):
-                    for prod in self.productions.get(rhs, []):
-                        if prod != rhs and prod not in self.productions[lhs]:
-                            self.productions[lhs].append(prod)
-                            changes = True
-                    self.productions[lhs] = [p for p in self.productions[lhs] if p != rhs]
-        self.productions = {lhs: list(set(rhs)) for lhs, rhs in self.productions.items()}
+            seen = {lhs}
+            worklist = [lhs]
+            while worklist:
+                for target in unit_targets.get(worklist.pop(), ()):
+                    if target not in seen:
+                        seen.add(target)
+                        worklist.append(target)
+            closure[lhs] = seen
+        return closure
+
+    def eliminate_unit_productions(self):
+        closure = self.unit_closure()
+        new_productions = {}
+        for lhs, targets in closure.items():
+            rules = {}
+            for target in targets:
+                for rhs in self.productions.get(target, []):
+                    if not self.is_unit(rhs):
+                        rules[rhs] = None
+            new_productions[lhs] = list(rules)
+        self.productions = new_productions
+
+    def eliminate_non_productive_symbols(self):
+        is_variable = self.symbols.is_variable
+        productive = self.find_productive_variables()
+        self.productions = {lhs: [rhs for rhs in rhs_list
+                                  if all(not is_variable[symbol] or symbol in productive for symbol in rhs)]
+                            for lhs, rhs_list in self.productions.items() if lhs in productive}
 
     def eliminate_inaccessible_symbols(self):
-        reachable = set()
-        to_process = {self.start_symbol}
-        while to_process:
-            symbol = to_process.pop()
-            if symbol not in reachable:
-                reachable.add(symbol)
-                for production in self.productions.get(symbol, []):
-                    for char in production:
-                        if char.isupper():
-                            to_process.add(char)
-        self.productions = {lhs: [rhs for rhs in rhss if all(c not in self.productions or c in reachable or not c.isupper() for c in rhs)]
-                            for lhs, rhss in self.productions.items() if lhs in reachable}
+        reachable = self.find_reachable_variables()
+        self.productions = {lhs: rhs_list for lhs, rhs_list in self.productions.items() if lhs in reachable}
+
+    def eliminate_useless_symbols(self):
+        self.eliminate_non_productive_symbols()
+        self.eliminate_inaccessible_symbols()
 
     def replace_long_productions(self):
         new_productions = {}
@@ -106,69 +241,593 @@ class CFG:
                 if len(rhs) <= 2:
                     new_productions[lhs].add(rhs)
                 else:
-                    symbols = list(rhs)
                     prev_var = self.generate_new_variable()
-                    new_productions.setdefault(prev_var, set()).add(symbols[0] + symbols[1])
-                    for i in range(2, len(symbols) - 1):
+                    new_productions.setdefault(prev_var, set()).add(rhs[:2])
+                    for i in range(2, len(rhs) - 1):
                         next_var = self.generate_new_variable()
-                        new_productions.setdefault(next_var, set()).add(prev_var + symbols[i])
+                        new_productions.setdefault(next_var, set()).add((prev_var, rhs[i]))
                         prev_var = next_var
-                    new_productions[lhs].add(prev_var + symbols[-1])
+                    new_productions[lhs].add((prev_var, rhs[-1]))
         self.productions = new_productions
 
     def replace_terminals_in_rules(self):
+        is_variable = self.symbols.is_variable
         new_productions = {}
         for lhs in self.productions:
             new_productions[lhs] = set()
             for rhs in self.productions[lhs]:
                 if len(rhs) == 1:
                     new_productions[lhs].add(rhs)
-                else:
-                    new_rhs = ''
-                    for symbol in rhs:
-                        if symbol.islower():
-                            if symbol in self.terminal_to_variable:
-                                var = self.terminal_to_variable[symbol]
-                            else:
-                                if symbol not in self.terminal_to_variable or len(self.productions.get(self.terminal_to_variable[symbol], [])) > 1:
-                                    var = self.generate_new_variable()
-                                    self.terminal_to_variable[symbol] = var
-                                    new_productions.setdefault(var, set()).add(symbol)
-                                else:
-                                    var = self.terminal_to_variable[symbol]
-                            new_rhs += var
-                        else:
-                            new_rhs += symbol
-                    new_productions[lhs].add(new_rhs)
+                    continue
+                new_rhs = []
+                for symbol in rhs:
+                    if not is_variable[symbol]:
+                        var = self.terminal_to_variable.get(symbol)
+                        if var is None:
+                            var = self.generate_new_variable()
+                            self.terminal_to_variable[symbol] = var
+                            new_productions.setdefault(var, set()).add((symbol,))
+                        symbol = var
+                    new_rhs.append(symbol)
+                new_productions[lhs].add(tuple(new_rhs))
         self.productions = new_productions
 
+    def stats(self):
+        symbols = set(self.productions)
+        size = 0
+        rules = 0
+        for rhs_list in self.productions.values():
+            rules += len(rhs_list)
+            for rhs in rhs_list:
+                size += len(rhs) + 1
+                symbols.update(rhs)
+        return {'rules': rules, 'symbols': len(symbols), 'size': size}
+
+    def to_cnf(self, order=CNF_ORDER, report=False):
+        # Runs the named stages in order and returns one stats entry per
+        # stage: rules before and after, distinct symbols, grammar size
+        # (symbols over all rules, left sides included) and wall time.
+        history = []
+        rules_in = self.stats()['rules']
+        for stage in order:
+            if stage not in self.CNF_STAGES:
+                raise ValueError(f"Unknown CNF stage: {stage}")
+            started = time.perf_counter()
+            getattr(self, self.CNF_STAGES[stage])()
+            seconds = time.perf_counter() - started
+            entry = {'stage': stage, 'rules_in': rules_in, **self.stats(), 'seconds': seconds}
+            history.append(entry)
+            rules_in = entry['rules']
+            if STATS is not None:
+                STATS.record(f'cnf.{stage}', started, started + seconds, rules_in=entry['rules_in'],
+                             rules_out=entry['rules'], symbols=entry['symbols'], size=entry['size'])
+            if report:
+                print(f"{stage:<6} rules={entry['rules']:<8} symbols={entry['symbols']:<7} "
+                      f"size={entry['size']:<8} {entry['seconds'] * 1000:.1f}ms")
+        return history
+
+    def string_productions(self):
+        names = self.symbols.names
+        return {names[lhs]: [self.symbols.to_string(rhs) for rhs in rhs_list]
+                for lhs, rhs_list in self.productions.items()}
+
     def display_productions(self):
-        start_rhs_list = sorted(self.productions.get(self.start_symbol, []))
+        productions = self.string_productions()
+        start = self.symbols.names[self.start_symbol]
+        start_rhs_list = sorted(productions.get(start, []))
         start_rhs_str = " | ".join(start_rhs_list)
-        print(f'{self.start_symbol} -> {start_rhs_str}')
-        for lhs in sorted(self.productions):
-            if lhs != self.start_symbol:
-                rhs_list = sorted(self.productions[lhs])
+        print(f'{start} -> {start_rhs_str}')
+        for lhs in sorted(productions):
+            if lhs != start:
+                rhs_list = sorted(productions[lhs])
                 rhs_str = " | ".join(rhs_list)
                 print(f'{lhs} -> {rhs_str}')
 
+class CYK:
+    # Recognizer and parser over a CNF grammar (as left by CFG.to_cnf). The
+    # chart is kept as bit-vectors: ends[v][i] has bit j set when variable v
+    # derives word[i:j], and starts[v][j] has bit i set for the same span.
+    # A rule A -> B C then covers word[i:j] exactly when
+    # ends[B][i] & starts[C][j] is non-zero, one AND per rule and cell
+    # instead of a loop over split points. Binary rules are indexed by their
+    # right-hand side pair.
+
+    # Bytes of chart accepts_many may allocate at once; larger batches of
+    # one length are checked in chunks that fit.
+    BATCH_BYTES = 64 * 2 ** 20
+
+    def __init__(self, cfg):
+        self.symbols = cfg.symbols
+        is_variable = cfg.symbols.is_variable
+        variables = [cfg.start_symbol, *cfg.productions]
+        for rhs_list in cfg.productions.values():
+            for rhs in rhs_list:
+                variables.extend(symbol for symbol in rhs if is_variable[symbol])
+        self.variables = list(dict.fromkeys(variables))
+        self.index = {variable: i for i, variable in enumerate(self.variables)}
+
+        self.pairs = {}
+        self.terminals = {}
+        self.accepts_empty = False
+        for lhs, rhs_list in cfg.productions.items():
+            for rhs in rhs_list:
+                if len(rhs) == 2 and is_variable[rhs[0]] and is_variable[rhs[1]]:
+                    pair = (self.index[rhs[0]], self.index[rhs[1]])
+                    self.pairs.setdefault(pair, []).append(self.index[lhs])
+                elif len(rhs) == 1 and not is_variable[rhs[0]]:
+                    self.terminals.setdefault(cfg.symbols.names[rhs[0]], []).append(self.index[lhs])
+                elif not rhs and lhs == cfg.start_symbol:
+                    self.accepts_empty = True
+                else:
+                    raise ValueError(f"Grammar is not in CNF: {cfg.symbols.names[lhs]} -> {cfg.symbols.to_string(rhs)}")
+        self.rules = [(lhs, left, right) for (left, right), lhs_list in self.pairs.items() for lhs in lhs_list]
+        self.start = 0
+
+    def chart(self, word):
+        # Fills ends and starts column by column: by the time word[i:j] is
+        # decided, every shorter span ending at j (larger i) and every span
+        # starting at i that ends before j is already recorded. Returns None
+        # as soon as a symbol has no terminal rule.
+        n = len(word)
+        count = len(self.variables)
+        ends = [[0] * (n + 1) for _ in range(count)]
+        starts = [[0] * (n + 1) for _ in range(count)]
+        rules = [(ends[lhs], starts[lhs], ends[left], starts[right]) for lhs, left, right in self.rules]
+        for end in range(1, n + 1):
+            variables = self.terminals.get(word[end - 1])
+            if variables is None:
+                return None
+            end_bit = 1 << end
+            for variable in variables:
+                ends[variable][end - 1] |= end_bit
+                starts[variable][end] |= 1 << (end - 1)
+            for start in range(end - 2, -1, -1):
+                for lhs_ends, lhs_starts, left_ends, right_starts in rules:
+                    if left_ends[start] & right_starts[end]:
+                        lhs_ends[start] |= end_bit
+                        lhs_starts[end] |= 1 << start
+        return ends
+
+    def accepts(self, word):
+        if not word:
+            return self.accepts_empty
+        ends = self.chart(word)
+        return ends is not None and bool(ends[self.start][0] >> len(word) & 1)
+
+    def parse(self, word):
+        # One parse tree as nested tuples: (variable, terminal) at the leaves,
+        # (variable, left, right) above them; None if word is rejected.
+        names = self.symbols.names
+        start_name = names[self.variables[self.start]]
+        if not word:
+            return (start_name, 'ε') if self.accepts_empty else None
+        ends = self.chart(word)
+        n = len(word)
+        if ends is None or not ends[self.start][0] >> n & 1:
+            return None
+
+        # Choose a rule and split for every node top-down, then build the
+        # tuples bottom-up; both passes are iterative.
+        nodes = [(self.start, 0, n)]
+        children = {}
+        position = 0
+        while position < len(nodes):
+            variable, start, end = nodes[position]
+            position += 1
+            if end - start == 1:
+                continue
+            for lhs, left, right in self.rules:
+                if lhs != variable:
+                    continue
+                splits = ends[left][start] & ~((1 << (start + 1)) - 1) & ((1 << end) - 1)
+                while splits:
+                    low_bit = splits & -splits
+                    middle = low_bit.bit_length() - 1
+                    if ends[right][middle] >> end & 1:
+                        break
+                    splits ^= low_bit
+                if splits:
+                    children[position - 1] = (len(nodes), len(nodes) + 1)
+                    nodes.append((left, start, middle))
+                    nodes.append((right, middle, end))
+                    break
+
+        trees = [None] * len(nodes)
+        for i in range(len(nodes) - 1, -1, -1):
+            variable, start, end = nodes[i]
+            if i in children:
+                left, right = children[i]
+                trees[i] = (names[self.variables[variable]], trees[left], trees[right])
+            else:
+                trees[i] = (names[self.variables[variable]], word[start])
+        return trees[0]
+
+    def accepts_many(self, words, max_bytes=None):
+        # Batch membership. With NumPy, words of equal length are checked
+        # together: ends and starts become uint64 arrays shaped
+        # (variable, n // 64 + 1, word, position), and each rule is applied
+        # to every span of one length in every word at once. At most
+        # max_bytes (BATCH_BYTES by default) of chart are allocated at a
+        # time. Returns a list of bools either way.
+        words = list(words)
+        max_bytes = self.BATCH_BYTES if max_bytes is None else max_bytes
+        if np is None:
+            return [self.accepts(word) for word in words]
+
+        result = np.zeros(len(words), dtype=bool)
+        by_length = {}
+        for i, word in enumerate(words):
+            by_length.setdefault(len(word), []).append(i)
+        for n, indices in by_length.items():
+            if n == 0:
+                result[indices] = self.accepts_empty
+                continue
+            group = [words[i] for i in indices]
+            known = [all(symbol in self.terminals for symbol in word) for word in group]
+            group = [word for word, ok in zip(group, known) if ok]
+            indices = [i for i, ok in zip(indices, known) if ok]
+            word_bytes = 2 * len(self.variables) * (n // 64 + 1) * (n + 1) * 8
+            chunk = max(1, max_bytes // word_bytes)
+            for first in range(0, len(group), chunk):
+                accepted = self._accepts_same_length(group[first:first + chunk], n)
+                result[indices[first:first + chunk]] = accepted
+        return result.tolist()
+
+    def _accepts_same_length(self, words, n):
+        count = len(self.variables)
+        batch = len(words)
+        width = n // 64 + 1
+        ends = np.zeros((count, width, batch, n + 1), dtype=np.uint64)
+        starts = np.zeros((count, width, batch, n + 1), dtype=np.uint64)
+        positions = np.arange(n + 1)
+        bits = np.uint64(1) << (positions % 64).astype(np.uint64)
+        words_axis = np.arange(batch)
+
+        for terminal, variables in self.terminals.items():
+            hits = np.array([[symbol == terminal for symbol in word] for word in words])
+            word_ids, position = np.nonzero(hits)
+            for variable in variables:
+                ends[variable, (position + 1) // 64, word_ids, position] |= bits[position + 1]
+                starts[variable, position // 64, word_ids, position + 1] |= bits[position]
+
+        for length in range(2, n + 1):
+            m = n - length + 1
+            for lhs, left, right in self.rules:
+                overlap = ends[left, 0, :, :m] & starts[right, 0, :, length:length + m]
+                for w in range(1, width):
+                    overlap |= ends[left, w, :, :m] & starts[right, w, :, length:length + m]
+                word_ids, start = np.nonzero(overlap)
+                if len(start):
+                    end = start + length
+                    ends[lhs, end // 64, word_ids, start] |= bits[end]
+                    starts[lhs, start // 64, word_ids, end] |= bits[start]
+        return (ends[self.start, n // 64, words_axis, 0] & bits[n]) != 0
+
+class Earley:
+    # Earley recognizer and parser over the raw CFG.productions (no CNF
+    # needed). Dotted rules are numbered once, so an item is a pair
+    # (dotted rule, origin). Per Aycock and Horspool, an item whose next
+    # symbol is nullable is also advanced past it, which makes empty
+    # completions unnecessary; what a variable predicts (with nullable
+    # prefixes already skipped) is precomputed. Items waiting on a symbol are
+    # indexed per set, and with leo=True deterministic right-recursive
+    # chains are completed in one step (Leo's items), which keeps right
+    # recursion linear.
+    def __init__(self, cfg):
+        self.symbols = cfg.symbols
+        is_variable = cfg.symbols.is_variable
+        self.goal = len(cfg.symbols.names)
+        self.rules = [(self.goal, (cfg.start_symbol,))]
+        self.rules += [(lhs, rhs) for lhs, rhs_list in cfg.productions.items() for rhs in rhs_list]
+        self.rules_of = {}
+        for rule_id, (lhs, _) in enumerate(self.rules):
+            self.rules_of.setdefault(lhs, []).append(rule_id)
+        nullable = cfg.find_nullable_variables()
+
+        # Dotted rule rule_start[r] + d is rule r with the dot before rhs[d].
+        self.rule_start = []
+        self.next_symbol = []
+        self.lhs = []
+        self.skippable = []
+        for rule_id, (lhs, rhs) in enumerate(self.rules):
+            self.rule_start.append(len(self.next_symbol))
+            for dot in range(len(rhs) + 1):
+                symbol = rhs[dot] if dot < len(rhs) else None
+                self.next_symbol.append(symbol)
+                self.lhs.append(lhs)
+                self.skippable.append(symbol is not None and symbol in nullable)
+        self.is_variable = lambda symbol: symbol < len(is_variable) and is_variable[symbol]
+
+        self.predictions = {}
+        for variable in self.rules_of:
+            items = []
+            symbols = {variable}
+            queue = [variable]
+            while queue:
+                for rule_id in self.rules_of.get(queue.pop(), ()):
+                    item = self.rule_start[rule_id]
+                    while True:
+                        items.append(item)
+                        symbol = self.next_symbol[item]
+                        if symbol is not None and self.is_variable(symbol) and symbol not in symbols:
+                            symbols.add(symbol)
+                            queue.append(symbol)
+                        if not self.skippable[item]:
+                            break
+                        item += 1
+            self.predictions[variable] = (items, symbols)
+
+    def chart(self, word, leo=True):
+        # Returns (seen, completed): seen[k] is the set of items in set k,
+        # completed[k][A] the origins of complete A items in set k. None if
+        # a symbol of word is not a terminal of the grammar.
+        ids = self.symbols.ids
+        terminals = []
+        for symbol in word:
+            terminal = ids.get(symbol)
+            if terminal is None or self.is_variable(terminal):
+                return None
+            terminals.append(terminal)
+        next_symbol, skippable, lhs_of = self.next_symbol, self.skippable, self.lhs
+        is_variable, predictions = self.is_variable, self.predictions
+
+        n = len(terminals)
+        seen = [set() for _ in range(n + 1)]
+        completed = [{} for _ in range(n + 1)]
+        waiting = [{} for _ in range(n + 1)]
+        leo_items = [{} for _ in range(n + 1)]
+        items = [(self.rule_start[0], 0)]
+        seen[0].add(items[0])
+
+        for k in range(n + 1):
+            current_seen, current_waiting, predicted = seen[k], waiting[k], set()
+
+            def add(item, origin):
+                while True:
+                    key = (item, origin)
+                    if key in current_seen:
+                        return
+                    current_seen.add(key)
+                    items.append(key)
+                    if not skippable[item]:
+                        return
+                    item += 1
+
+            position = 0
+            while position < len(items):
+                item, origin = items[position]
+                position += 1
+                symbol = next_symbol[item]
+                if symbol is None:
+                    lhs = lhs_of[item]
+                    completed[k].setdefault(lhs, set()).add(origin)
+                    if leo and origin < k:
+                        top = self.leo_item(origin, lhs, waiting, leo_items)
+                        if top is not None:
+                            add(*top)
+                            continue
+                    for waiting_item, waiting_origin in waiting[origin].get(lhs, ()):
+                        add(waiting_item + 1, waiting_origin)
+                    continue
+                current_waiting.setdefault(symbol, []).append((item, origin))
+                if is_variable(symbol) and symbol not in predicted:
+                    prediction_items, prediction_symbols = predictions.get(symbol, ((), ()))
+                    predicted.update(prediction_symbols)
+                    for predicted_item in prediction_items:
+                        key = (predicted_item, k)
+                        if key not in current_seen:
+                            current_seen.add(key)
+                            items.append(key)
+
+            if k == n:
+                break
+            items = []
+            for waiting_item, waiting_origin in current_waiting.get(terminals[k], ()):
+                key = (waiting_item + 1, waiting_origin)
+                if key not in seen[k + 1]:
+                    seen[k + 1].add(key)
+                    items.append(key)
+            # add() only walks the skippable chain of items it creates;
+            # scanned items need the same treatment before set k + 1 runs.
+            for item, origin in list(items):
+                while skippable[item]:
+                    item += 1
+                    if (item, origin) not in seen[k + 1]:
+                        seen[k + 1].add((item, origin))
+                        items.append((item, origin))
+            if not items:
+                return seen[:k + 2], completed[:k + 2]
+        return seen, completed
+
+    def leo_item(self, origin, symbol, waiting, leo_items):
+        # The topmost complete item of the deterministic chain that a
+        # complete symbol item from origin starts, or None if the first step
+        # is not deterministic: exactly one item of set origin waits on
+        # symbol, and it becomes complete right after it.
+        chain = []
+        result = None
+        while True:
+            memo = leo_items[origin]
+            if symbol in memo:
+                result = memo[symbol]
+                break
+            waiters = waiting[origin].get(symbol, ())
+            if len(waiters) != 1 or self.next_symbol[waiters[0][0] + 1] is not None:
+                memo[symbol] = None
+                break
+            item, item_origin = waiters[0]
+            chain.append((origin, symbol, (item + 1, item_origin)))
+            origin, symbol = item_origin, self.lhs[item]
+        for chain_origin, chain_symbol, top in reversed(chain):
+            if result is None:
+                result = top
+            leo_items[chain_origin][chain_symbol] = result
+        return result
+
+    def accepts(self, word):
+        chart = self.chart(word)
+        if chart is None:
+            return False
+        seen, _ = chart
+        return len(seen) == len(word) + 1 and (self.rule_start[0] + 1, 0) in seen[-1]
+
+    def parse(self, word):
+        # Shared packed parse forest of every derivation of word, or None.
+        chart = self.chart(word, leo=False)
+        if chart is None:
+            return None
+        seen, completed = chart
+        if len(seen) != len(word) + 1 or (self.rule_start[0] + 1, 0) not in seen[-1]:
+            return None
+        return ParseForest(self, word, seen, completed)
+
+class ParseForest:
+    # Shared packed parse forest read off a complete Earley chart. Node keys:
+    # ('S', A, i, j) when A derives word[i:j], ('R', r, d, i, j) when the
+    # first d symbols of rule r derive word[i:j], and ('T', k) for word[k].
+    # nodes maps every node reachable from the root to its alternatives;
+    # each alternative is a tuple of child keys.
+    def __init__(self, earley, word, seen, completed):
+        self.earley = earley
+        self.word = word
+        self.root = ('S', earley.rules[0][1][0], 0, len(word))
+        self.nodes = {}
+        rule_start, rules = earley.rule_start, earley.rules
+        worklist = [self.root]
+        while worklist:
+            key = worklist.pop()
+            if key in self.nodes or key[0] == 'T':
+                continue
+            alternatives = []
+            if key[0] == 'S':
+                _, variable, i, j = key
+                for rule_id in earley.rules_of.get(variable, ()):
+                    length = len(rules[rule_id][1])
+                    if (rule_start[rule_id] + length, i) in seen[j]:
+                        alternatives.append((('R', rule_id, length, i, j),))
+            else:
+                _, rule_id, dot, i, j = key
+                if dot == 0:
+                    alternatives.append(())
+                else:
+                    symbol = rules[rule_id][1][dot - 1]
+                    previous = (rule_start[rule_id] + dot - 1, i)
+                    if earley.is_variable(symbol):
+                        splits = sorted(k for k in completed[j].get(symbol, ()) if k >= i and previous in seen[k])
+                        for k in splits:
+                            alternatives.append((('R', rule_id, dot - 1, i, k), ('S', symbol, k, j)))
+                    elif previous in seen[j - 1] and word[j - 1] == earley.symbols.names[symbol]:
+                        alternatives.append((('R', rule_id, dot - 1, i, j - 1), ('T', j - 1)))
+            self.nodes[key] = alternatives
+            for alternative in alternatives:
+                worklist.extend(alternative)
+
+    def _well_founded(self):
+        # Picks for every node an alternative whose children were all
+        # settled before it (counting worklist, as in CFG.propagate), so
+        # following the choices never loops even on cyclic forests.
+        remaining = {}
+        parents = {}
+        ready = []
+        for key, alternatives in self.nodes.items():
+            for index, alternative in enumerate(alternatives):
+                pending = [child for child in alternative if child[0] != 'T']
+                remaining[(key, index)] = len(pending)
+                if not pending:
+                    ready.append((key, index))
+                for child in pending:
+                    parents.setdefault(child, []).append((key, index))
+        chosen = {}
+        while ready:
+            key, index = ready.pop()
+            if key in chosen:
+                continue
+            chosen[key] = index
+            for parent in parents.get(key, ()):
+                remaining[parent] -= 1
+                if remaining[parent] == 0:
+                    ready.append(parent)
+        return chosen
+
+    def tree(self):
+        # One derivation as nested tuples (variable, child, ...), terminals
+        # as plain strings; built bottom-up without recursion.
+        chosen = self._well_founded()
+        names = self.earley.symbols.names
+        order = []
+        stack = [self.root]
+        while stack:
+            key = stack.pop()
+            order.append(key)
+            if key[0] != 'T':
+                stack.extend(self.nodes[key][chosen[key]])
+        built = {}
+        for key in reversed(order):
+            if key[0] == 'T':
+                built[key] = self.word[key[1]]
+                continue
+            children = [built[child] for child in self.nodes[key][chosen[key]]]
+            if key[0] == 'S':
+                built[key] = (names[key[1]], *children[0])
+            else:
+                built[key] = (*children[0], children[1]) if children else ()
+        return built[self.root]
+
+    def count(self):
+        # Number of distinct derivations; float('inf') if the forest has a
+        # cycle through nodes that take part in some complete derivation.
+        useful = self._well_founded()
+        counts = {}
+        state = {}
+        stack = [self.root]
+        while stack:
+            key = stack[-1]
+            if key[0] == 'T' or key in counts:
+                stack.pop()
+                continue
+            alternatives = [alternative for alternative in self.nodes[key]
+                            if all(child[0] == 'T' or child in useful for child in alternative)]
+            if state.get(key) is None:
+                state[key] = 'open'
+                for alternative in alternatives:
+                    for child in alternative:
+                        if child[0] == 'T' or child in counts:
+                            continue
+                        if state.get(child) == 'open':
+                            return float('inf')
+                        stack.append(child)
+                continue
+            stack.pop()
+            total = 0
+            for alternative in alternatives:
+                product = 1
+                for child in alternative:
+                    product *= 1 if child[0] == 'T' else counts[child]
+                total += product
+            counts[key] = total
+        return counts[self.root]
+
+if __name__ == "__main__":
+    productions = {
+        'S': ['aA', 'AC'],
+        'A': ['a', 'ASC', 'BC', 'aD'],
+        'B': ['b', 'bA'],
+        'C': ['ε', 'BA'],
+        'E': ['aB'],
+        'D': ['abC']
+    }
+    start_symbol = 'S'
+
+    cfg = CFG(productions, start_symbol)
 
-productions = {
-    'S': ['aA', 'AC'],
-    'A': ['a', 'ASC', 'BC', 'aD'],
-    'B': ['b', 'bA'],
-    'C': ['ε', 'BA'],
-    'E': ['aB'],
-    'D': ['abC']
-}
-start_symbol = 'S'
+    cfg.to_cnf(report=True)
 
-cfg = CFG(productions, start_symbol)
+    cfg.display_productions()
 
-cfg.eliminate_epsilon_productions()
-cfg.eliminate_unit_productions()
-cfg.eliminate_inaccessible_symbols()
-cfg.replace_long_productions()
-cfg.replace_terminals_in_rules()
+    cyk = CYK(cfg)
+    for word in ['a', 'ba', 'aab', '', 'c']:
+        print(f"{word}: {cyk.accepts(word)}")
 
-cfg.display_productions()
+    earley = Earley(CFG(productions, start_symbol))
+    forest = earley.parse('aab')
+    print(f"Earley on the original grammar: aab has {forest.count()} parse tree(s), e.g. {forest.tree()}")
@@ -0,0 +1,368 @@
+import os
+import sys
+import time
+from typing import Dict, List, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+import labs
+import lexer
+from lexer import Token, TokenType
+
+# Characters outside every class named in the specification share one input
+# symbol. The identifier classes name every ASCII word character, and the
+# token regex uses ASCII \b, so \b never counts them as word characters.
+OTHER = '<other>'
+WORD_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+DIGITS = set('0123456789')
+WHITESPACE = set(' \t\n\r\f\v')
+
+class RegexParser:
+    # Parses the subset of Python regex syntax used by token_specification
+    # into a small AST: ('set', chars, negated), ('cat', a, b), ('alt', a, b),
+    # ('star', a), ('opt', a), ('eps',). A \b at either end of a pattern is
+    # returned separately instead of becoming part of the tree.
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.pos = 0
+
+    def parse(self):
+        bounded = False
+        if self.pattern.startswith(r'\b'):
+            self.pos = 2
+            bounded = True
+        end = len(self.pattern)
+        if self.pattern.endswith(r'\b') and end > self.pos:
+            end -= 2
+            bounded = True
+        self.end = end
+        tree = self.parse_alt()
+        if self.pos != self.end:
+            raise RuntimeError(f"Unsupported regex syntax at {self.pos} in {self.pattern!r}")
+        return tree, bounded
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < self.end else None
+
+    def parse_alt(self):
+        node = self.parse_cat()
+        while self.peek() == '|':
+            self.pos += 1
+            node = ('alt', node, self.parse_cat())
+        return node
+
+    def parse_cat(self):
+        node = ('eps',)
+        while self.peek() not in (None, '|', ')'):
+            atom = self.parse_repeat()
+            node = atom if node == ('eps',) else ('cat', node, atom)
+        return node
+
+    def parse_repeat(self):
+        node = self.parse_atom()
+        while self.peek() in ('*', '+', '?', '{'):
+            op = self.peek()
+            self.pos += 1
+            if op == '*':
+                node = ('star', node)
+            elif op == '+':
+                node = ('cat', node, ('star', node))
+            elif op == '?':
+                node = ('opt', node)
+            else:
+                close = self.pattern.index('}', self.pos)
+                bounds = self.pattern[self.pos:close].split(',')
+                self.pos = close + 1
+                low = int(bounds[0])
+                high = int(bounds[-1]) if bounds[-1] else None
+                node = repeat(node, low, high)
+        return node
+
+    def parse_atom(self):
+        char = self.peek()
+        self.pos += 1
+        if char == '(':
+            node = self.parse_alt()
+            if self.peek() != ')':
+                raise RuntimeError(f"Unbalanced parenthesis in {self.pattern!r}")
+            self.pos += 1
+            return node
+        if char == '[':
+            return self.parse_class()
+        if char == '.':
+            return ('set', {'\n'}, True)
+        if char == '\\':
+            return ('set',) + self.parse_escape()
+        return ('set', {char}, False)
+
+    def parse_escape(self):
+        char = self.pattern[self.pos]
+        self.pos += 1
+        if char == 'd':
+            return set(DIGITS), False
+        if char == 'w':
+            return set(WORD_CHARS), False
+        if char == 's':
+            return set(WHITESPACE), False
+        if char == 'b':
+            raise RuntimeError(r"\b is only supported at the ends of a pattern")
+        return {{'t': '\t', 'n': '\n'}.get(char, char)}, False
+
+    def parse_class(self):
+        negated = self.peek() == '^'
+        if negated:
+            self.pos += 1
+        chars = set()
+        first = True
+        while first or self.peek() != ']':
+            first = False
+            char = self.pattern[self.pos]
+            self.pos += 1
+            if char == '\\':
+                chars |= self.parse_escape()[0]
+                continue
+            if self.peek() == '-' and self.pattern[self.pos + 1] != ']':
+                last = self.pattern[self.pos + 1]
+                self.pos += 2
+                chars |= {chr(c) for c in range(ord(char), ord(last) + 1)}
+            else:
+                chars.add(char)
+        self.pos += 1
+        return ('set', chars, negated)
+
+def repeat(node, low, high):
+    parts = [node] * low
+    if high is None:
+        parts.append(('star', node))
+    else:
+        parts += [('opt', node)] * (high - low)
+    result = ('eps',)
+    for part in parts:
+        result = part if result == ('eps',) else ('cat', result, part)
+    return result
+
+def literal(word: str):
+    node = ('eps',)
+    for char in word:
+        atom = ('set', {char}, False)
+        node = atom if node == ('eps',) else ('cat', node, atom)
+    return node
+
+class Glushkov:
+    # Position automaton: every character-set leaf becomes one NFA state, so
+    # the result has no epsilon moves and fits lab-2's Automaton directly.
+    def __init__(self):
+        self.positions: List[Tuple[Set[str], bool]] = []
+        self.follow: Dict[int, Set[int]] = {}
+
+    def visit(self, node):
+        kind = node[0]
+        if kind == 'eps':
+            return True, set(), set()
+        if kind == 'set':
+            position = len(self.positions)
+            self.positions.append((node[1], node[2]))
+            self.follow[position] = set()
+            return False, {position}, {position}
+        if kind == 'cat':
+            null_a, first_a, last_a = self.visit(node[1])
+            null_b, first_b, last_b = self.visit(node[2])
+            for position in last_a:
+                self.follow[position] |= first_b
+            return (null_a and null_b,
+                    first_a | first_b if null_a else first_a,
+                    last_a | last_b if null_b else last_b)
+        if kind == 'alt':
+            null_a, first_a, last_a = self.visit(node[1])
+            null_b, first_b, last_b = self.visit(node[2])
+            return null_a or null_b, first_a | first_b, last_a | last_b
+        if kind == 'star':
+            _, first, last = self.visit(node[1])
+            for position in last:
+                self.follow[position] |= first
+            return True, first, last
+        if kind == 'opt':
+            _, first, last = self.visit(node[1])
+            return True, first, last
+        raise RuntimeError(f"Unknown regex node {kind}")
+
+def token_rules():
+    # (token kind, regex AST, needs \b at its end) in priority order. The
+    # allowed keywords and identifiers are spelled out ahead of the general
+    # identifier pattern, which only survives as an error kind.
+    rules = []
+    for name, pattern in lexer.token_specification:
+        if name == 'MISMATCH':
+            continue
+        tree, bounded = RegexParser(pattern).parse()
+        if name == 'KEYWORD':
+            for word in sorted(lexer.VALID_KEYWORDS):
+                rules.append(('KEYWORD', literal(word), True))
+            continue
+        if name == 'IDENTIFIER':
+            for word in sorted(lexer.VALID_IDENTIFIERS):
+                rules.append(('IDENTIFIER', literal(word), True))
+            rules.append(('INVALID_IDENTIFIER', tree, bounded))
+            continue
+        rules.append((name, tree, bounded))
+    return rules
+
+class DFALexer:
+    def __init__(self):
+        lab2 = labs.lab2()
+        rules = token_rules()
+        self.kinds = list(dict.fromkeys(name for name, _, _ in rules))
+        self.bounded = {name: bounded for name, _, bounded in rules}
+
+        # NFA over single characters plus OTHER. Accepting positions get an
+        # edge on '#<kind>' into one shared accept state, so subset
+        # construction and Hopcroft keep different token kinds apart.
+        charset = set()
+        built = []
+        for index, (name, tree, _) in enumerate(rules):
+            glushkov = Glushkov()
+            nullable, first, last = glushkov.visit(tree)
+            if nullable:
+                raise RuntimeError(f"Token {name} matches the empty string")
+            built.append((index, name, glushkov, first, last))
+            for chars, _ in glushkov.positions:
+                charset |= chars
+        self.symbols = sorted(charset) + [OTHER]
+
+        def symbols_of(chars, negated):
+            if negated:
+                return [s for s in self.symbols if s not in chars]
+            return sorted(chars)
+
+        transitions = {}
+        states = {'start', 'accept'}
+        for index, name, glushkov, first, last in built:
+            for position, (chars, negated) in enumerate(glushkov.positions):
+                state = f'{index}:{position}'
+                states.add(state)
+                for target in glushkov.follow[position]:
+                    for symbol in symbols_of(*glushkov.positions[target]):
+                        transitions.setdefault((state, symbol), []).append(f'{index}:{target}')
+            for target in first:
+                for symbol in symbols_of(*glushkov.positions[target]):
+                    transitions.setdefault(('start', symbol), []).append(f'{index}:{target}')
+            for position in last:
+                transitions.setdefault((f'{index}:{position}', '#' + name), []).append('accept')
+
+        tag_symbols = {'#' + name for name in self.kinds}
+        nfa = lab2.Automaton(states, set(self.symbols) | tag_symbols, transitions, 'start', {'accept'})
+        self.nfa_states = len(states)
+
+        # Where several kinds accept the same input, keep only the first
+        # in priority order before minimizing.
+        dfa = nfa.convert_to_dfa()
+        self.dfa_states = len(dfa.states)
+        for state in dfa.states:
+            accepted = [name for name in self.kinds if (state, '#' + name) in dfa.transitions]
+            for name in accepted[1:]:
+                del dfa.transitions[(state, '#' + name)]
+        minimal = dfa.minimize()
+        self.min_states = len(minimal.states)
+
+        names = sorted(minimal.states - minimal.final_states, key=lambda s: int(s[1:]))
+        index = {name: i for i, name in enumerate(names)}
+        symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.start = index[minimal.start_state]
+        self.table = [[-1] * len(self.symbols) for _ in names]
+        self.accepts = [None] * len(names)
+        for (state, symbol), targets in minimal.transitions.items():
+            if symbol in tag_symbols:
+                self.accepts[index[state]] = symbol[1:]
+            else:
+                self.table[index[state]][symbol_index[symbol]] = index[targets[0]]
+
+        self.class_map = ClassMap(symbol_index[OTHER])
+        self.class_map.update({ord(symbol): chr(i) for symbol, i in symbol_index.items() if symbol != OTHER})
+        self.is_word = [symbol in WORD_CHARS for symbol in self.symbols]
+        self.word_bounded = [kind is not None and self.bounded[kind] for kind in self.accepts]
+
+    def tokenize(self, code: str) -> List[Token]:
+        classes = code.translate(self.class_map).encode('latin-1')
+        table, accepts, bounded, is_word = self.table, self.accepts, self.word_bounded, self.is_word
+        length = len(code)
+        tokens = []
+        pos = 0
+        while pos < length:
+            # Maximal munch with the last accepting position remembered, so
+            # '1914-1918x' falls back to '1914' just like the regex does.
+            state = self.start
+            i = pos
+            last_end = -1
+            last_kind = None
+            while i < length:
+                state = table[state][classes[i]]
+                if state < 0:
+                    break
+                i += 1
+                kind = accepts[state]
+                if kind is not None and (not bounded[state] or i == length or not is_word[classes[i]]):
+                    last_end = i
+                    last_kind = kind
+            if last_kind is None:
+                # Nothing matches a line break, not even MISMATCH's '.';
+                # finditer, and so lexer.lexer, steps over it.
+                if code[pos] == '\n':
+                    pos += 1
+                    continue
+                raise RuntimeError(f'Unexpected character: {code[pos]}')
+            if last_kind == 'INVALID_IDENTIFIER':
+                raise RuntimeError(f"Error: Invalid identifier '{code[pos:last_end]}'")
+            if last_kind == 'STRING':
+                tokens.append(Token(TokenType.STRING, code[pos + 1:last_end - 1]))
+            elif last_kind != 'SKIP':
+                tokens.append(Token(TokenType[last_kind], code[pos:last_end]))
+            pos = last_end
+        tokens.append(Token(TokenType.EOF, ''))
+        return tokens
+
+class ClassMap(dict):
+    # str.translate table: characters not named by any token class map to
+    # the shared OTHER symbol, and the answer is memoized.
+    def __init__(self, other: int):
+        super().__init__()
+        self.other = chr(other)
+
+    def __missing__(self, key):
+        self[key] = self.other
+        return self.other
+
+_default_lexer = None
+
+def dfa_lexer(code: str) -> List[Token]:
+    global _default_lexer
+    if _default_lexer is None:
+        _default_lexer = DFALexer()
+    return _default_lexer.tokenize(code)
+
+def benchmark(statements: int = 20000):
+    parts = []
+    for i in range(statements):
+        parts.append(f'event("Battle {i}", {1000 + i % 900}-{1001 + i % 900}, type = "war")')
+        parts.append(f'\nperson("Person {i}", born = {1800 + i % 200}, died = {1850 + i % 150})')
+    code = ', '.join(parts)
+
+    start = time.perf_counter()
+    generated = DFALexer()
+    build_time = time.perf_counter() - start
+    print(f"NFA states: {generated.nfa_states}, DFA states: {generated.dfa_states}, "
+          f"minimized: {generated.min_states}, build time: {build_time:.2f}s")
+
+    start = time.perf_counter()
+    expected = lexer.lexer(code)
+    regex_time = time.perf_counter() - start
+    start = time.perf_counter()
+    tokens = generated.tokenize(code)
+    dfa_time = time.perf_counter() - start
+    assert [(t.type, t.value) for t in tokens] == [(t.type, t.value) for t in expected]
+    print(f"{len(tokens)} tokens, {len(code)} characters")
+    print(f"  compiled_regex.finditer: {len(tokens) / regex_time:,.0f} tokens/s")
+    print(f"  DFA table lexer:         {len(tokens) / dfa_time:,.0f} tokens/s")
+
+if __name__ == '__main__':
+    benchmark()
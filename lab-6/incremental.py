@@ -0,0 +1,213 @@
+import time
+from typing import Iterator, List, Optional
+
+import lexer
+from lexer import Token, TokenType
+from parser import Parser, PTNode
+
+# Incremental lexing and parsing. The document is kept as a list of top-level
+# units (one per Statement or separating comma), each holding its own tokens
+# with offsets relative to the unit start. An edit re-lexes and re-parses from
+# the unit before the damage and stops as soon as a new unit starts where an
+# old unit past the damage used to start.
+#
+# The one long-range dependency in the lexer is an unterminated '"': it only
+# lexes as an error because no closing quote follows, so while any exists the
+# damaged region is widened back to the first of them.
+#
+# Unit start offsets live behind a gap: units[i].start is exact for
+# i < gap and short by gap_delta for i >= gap. Moving the gap costs the
+# distance moved, so edits near each other never touch the rest of the
+# document.
+
+OPEN_QUOTE = 'Unexpected character: "'
+
+class Unit:
+    __slots__ = ('start', 'tokens', 'node', 'error')
+
+    def __init__(self, start: int, tokens: List[Token], node: PTNode, error: Optional[str] = None):
+        self.start = start
+        self.tokens = tokens
+        self.node = node
+        self.error = error
+
+def lex_from(code: str, pos: int) -> Iterator[Token]:
+    # Like lexer.lexer, but lazy, starting at pos, and reporting bad input as
+    # ERROR tokens (type None) instead of raising.
+    match = lexer.compiled_regex.match
+    end = len(code)
+    while pos < end:
+        m = lexer.next_match(match, code, pos, end)
+        if m is None:
+            break
+        kind = m.lastgroup
+        value = m.group()
+        pos = m.start()
+        if kind == 'SKIP':
+            pass
+        elif kind == 'MISMATCH':
+            yield Token(None, f'Unexpected character: {value}', pos)
+        elif kind == 'IDENTIFIER' and value not in lexer.VALID_IDENTIFIERS:
+            yield Token(None, f"Error: Invalid identifier '{value}'", pos)
+        elif kind == 'STRING':
+            yield Token(TokenType.STRING, value.strip('"'), pos)
+        else:
+            yield Token(TokenType[kind], value, pos)
+        pos = m.end()
+
+def has_open_quote(unit: Unit) -> bool:
+    return unit.error is not None and any(token.type is None and token.value == OPEN_QUOTE for token in unit.tokens)
+
+class IncrementalDocument:
+    def __init__(self, code: str):
+        self.code = code
+        self.units: List[Unit] = []
+        self.root = PTNode('Timeline')
+        self.gap = 0
+        self.gap_delta = 0
+        self.last_edit = {}
+        units, _ = self._build_units(0, None)
+        self.units = units
+        self.root.children = [unit.node for unit in units]
+        self.open_quotes = sum(map(has_open_quote, units))
+
+    def _start(self, i: int) -> int:
+        unit = self.units[i]
+        return unit.start + self.gap_delta if i >= self.gap else unit.start
+
+    def _move_gap(self, i: int):
+        units = self.units
+        while self.gap < i:
+            units[self.gap].start += self.gap_delta
+            self.gap += 1
+        while self.gap > i:
+            self.gap -= 1
+            units[self.gap].start -= self.gap_delta
+
+    def _find(self, offset: int) -> int:
+        # Index of the last unit starting at or before offset, or -1.
+        low, high = 0, len(self.units)
+        while low < high:
+            mid = (low + high) // 2
+            if self._start(mid) <= offset:
+                low = mid + 1
+            else:
+                high = mid
+        return low - 1
+
+    def _build_units(self, pos: int, resync):
+        # Splits the token stream from pos into units. resync(start) is asked
+        # before each new unit and returns the old unit index to stop at.
+        tokens = lex_from(self.code, pos)
+        pending = next(tokens, None)
+        units = []
+        while pending is not None:
+            if resync is not None:
+                stop = resync(pending.offset)
+                if stop is not None:
+                    return units, stop
+            start = pending.offset
+            group = [pending]
+            pending = next(tokens, None)
+            if group[0].type == TokenType.KEYWORD:
+                while pending is not None and pending.type != TokenType.KEYWORD:
+                    group.append(pending)
+                    pending = next(tokens, None)
+                    if group[-1].type == TokenType.RPAREN:
+                        break
+            elif group[0].type != TokenType.COMMA:
+                while pending is not None and pending.type != TokenType.KEYWORD:
+                    group.append(pending)
+                    pending = next(tokens, None)
+            units.append(self._make_unit(start, group))
+        return units, None
+
+    def _make_unit(self, start: int, group: List[Token]) -> Unit:
+        for token in group:
+            token.offset -= start
+        first = group[0]
+        if first.type == TokenType.COMMA:
+            return Unit(start, group, PTNode(first.value))
+        bad = next((token for token in group if token.type is None), None)
+        if bad is not None:
+            return Unit(start, group, PTNode('Error'), bad.value)
+        if first.type != TokenType.KEYWORD:
+            return Unit(start, group, PTNode('Error'), f"Expected {TokenType.KEYWORD} but got {first.type}")
+        parser = Parser(group + [Token(TokenType.EOF, '')])
+        try:
+            node = parser.parse_statement()
+        except RuntimeError as e:
+            return Unit(start, group, PTNode('Error'), str(e))
+        if parser.pos != len(group):
+            return Unit(start, group, PTNode('Error'), f"Unexpected {group[parser.pos].type}")
+        return Unit(start, group, node)
+
+    def edit(self, offset: int, deleted: int, inserted: str) -> dict:
+        started = time.perf_counter()
+        old_end = offset + deleted
+        delta = len(inserted) - deleted
+        self.code = self.code[:offset] + inserted + self.code[old_end:]
+
+        first = max(self._find(offset) - 1, 0)
+        if self.open_quotes:
+            for i in range(first - 1, -1, -1):
+                if has_open_quote(self.units[i]):
+                    first = i
+        region_start = self._start(first) if first > 0 else 0
+
+        def resync(new_start):
+            old_start = new_start - delta
+            if old_start < old_end:
+                return None
+            i = self._find(old_start)
+            if i >= 0 and self._start(i) == old_start:
+                return i
+            return None
+
+        new_units, stop = self._build_units(region_start, resync)
+        if stop is None:
+            stop = len(self.units)
+
+        self._move_gap(stop)
+        self.open_quotes += sum(map(has_open_quote, new_units))
+        self.open_quotes -= sum(map(has_open_quote, self.units[first:stop]))
+        self.units[first:stop] = new_units
+        self.root.children[first:stop] = [unit.node for unit in new_units]
+        self.gap = first + len(new_units)
+        self.gap_delta += delta
+
+        self.last_edit = {
+            'units_replaced': stop - first,
+            'units_parsed': len(new_units),
+            'tokens_lexed': sum(len(unit.tokens) for unit in new_units),
+            'seconds': time.perf_counter() - started,
+        }
+        return self.last_edit
+
+    @property
+    def tree(self) -> PTNode:
+        return self.root
+
+    def errors(self):
+        return [(self._start(i), unit.error) for i, unit in enumerate(self.units) if unit.error]
+
+    def tokens(self) -> List[Token]:
+        result = []
+        for i, unit in enumerate(self.units):
+            start = self._start(i)
+            result.extend(Token(token.type, token.value, start + token.offset) for token in unit.tokens)
+        result.append(Token(TokenType.EOF, '', len(self.code)))
+        return result
+
+if __name__ == '__main__':
+    parts = [f'event("Battle {i}", {1000 + i % 900}, type = "war")' for i in range(50000)]
+    document = IncrementalDocument(',\n'.join(parts))
+    position = len(document.code) // 2
+    position = document.code.index('"war"', position) + 1
+    for keystroke in 'peace':
+        stats = document.edit(position, 0, keystroke)
+        position += 1
+    print(f"{len(document.code)} characters, typing in the middle: {stats}")
+    start = time.perf_counter()
+    Parser(lexer.lexer(document.code)).parse()
+    print(f"full lexer + parse: {time.perf_counter() - start:.3f}s")
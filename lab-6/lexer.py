@@ -1,6 +1,9 @@
+import mmap
 import re
+import time
+from array import array
 from enum import Enum, auto
-from typing import List, Union
+from typing import BinaryIO, Iterator, List, Union
 
 class TokenType(Enum):
     KEYWORD = auto()
@@ -18,9 +21,12 @@ VALID_KEYWORDS = {"event", "person", "link"}
 VALID_IDENTIFIERS = {"born", "died", "type", "caused", "related"}
 
 class Token:
-    def __init__(self, type: TokenType, value: Union[str, int, float]):
+    __slots__ = ('type', 'value', 'offset')
+
+    def __init__(self, type: TokenType, value: Union[str, int, float], offset: int = None):
         self.type = type
         self.value = value
+        self.offset = offset
 
     def __repr__(self):
         return f'Token({self.type}, {repr(self.value)})'
@@ -40,11 +46,46 @@ token_specification = [
 ]
 
 token_regex = '|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in token_specification)
-compiled_regex = re.compile(token_regex)
+# ASCII rules for \b, as in the bytes regex below, so a str and its UTF-8
+# encoding lex the same even next to non-ASCII letters.
+compiled_regex = re.compile(token_regex, re.ASCII)
+
+def next_match(match, text, pos: int, end: int):
+    # One step of finditer from pos, for scanners that drive match()
+    # themselves: the match at pos or, where no alternative matches (only
+    # '\n', which MISMATCH's '.' excludes), at the next position that does.
+    # None if nothing matches before end.
+    while pos < end:
+        m = match(text, pos)
+        if m is not None:
+            return m
+        pos += 1
+    return None
+
+# Optional instrumentation hook (see benchmarks/instrument.py). Only an
+# instrumented call pays for timing the regex engine separately.
+STATS = None
+
+def timed(iterator: Iterator, spent: List[float]) -> Iterator:
+    # Yields from iterator, adding the time spent inside next() to spent[0].
+    clock = time.perf_counter
+    while True:
+        before = clock()
+        item = next(iterator, None)
+        spent[0] += clock() - before
+        if item is None:
+            return
+        yield item
 
 def lexer(code: str) -> List[Token]:
+    stats = STATS
+    matches = compiled_regex.finditer(code)
+    if stats is not None:
+        started = time.perf_counter()
+        regex_time = [0.0]
+        matches = timed(matches, regex_time)
     tokens = []
-    for match in compiled_regex.finditer(code):
+    for match in matches:
         type = match.lastgroup
         value = match.group(type)
         if type == 'KEYWORD':
@@ -72,8 +113,200 @@ def lexer(code: str) -> List[Token]:
         elif type == 'MISMATCH':
             raise RuntimeError(f'Unexpected character: {value}')
     tokens.append(Token(TokenType.EOF, ''))
+    if stats is not None:
+        stats.record('lexer', started, chars=len(code), tokens=len(tokens), regex_seconds=regex_time[0])
+    return tokens
+
+# Compact token stream: parallel typed arrays of type code and source span,
+# with values sliced from the source only when asked for.
+TOKEN_TYPES = [None] * (max(token_type.value for token_type in TokenType) + 1)
+for token_type in TokenType:
+    TOKEN_TYPES[token_type.value] = token_type
+
+class TokenArray:
+    def __init__(self, source: Union[str, bytes]):
+        self.source = source
+        self.codes = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def type(self, i: int) -> TokenType:
+        return TOKEN_TYPES[self.codes[i]]
+
+    def span(self, i: int):
+        start, end = self.starts[i], self.ends[i]
+        if self.codes[i] == TokenType.STRING.value:
+            return start + 1, end - 1
+        return start, end
+
+    def value(self, i: int) -> str:
+        start, end = self.span(i)
+        if isinstance(self.source, str):
+            return self.source[start:end]
+        return bytes(self.source[start:end]).decode('utf-8')
+
+    def raw(self, i: int) -> memoryview:
+        # Zero-copy view of the token text; only for arrays lexed from a
+        # bytes-like source (lex_array(bytes)).
+        start, end = self.span(i)
+        return memoryview(self.source)[start:end]
+
+    def __getitem__(self, i: int) -> Token:
+        return Token(self.type(i), self.value(i), self.starts[i])
+
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self.codes)):
+            yield self[i]
+
+def lex_array(code: Union[str, bytes]) -> TokenArray:
+    # code may also be bytes-like (bytes, mmap, ...): spans are then byte
+    # offsets and TokenArray.raw gives zero-copy views of the token text.
+    text = isinstance(code, str)
+    regex = compiled_regex if text else compiled_bytes_regex
+    identifiers = VALID_IDENTIFIERS if text else {name.encode() for name in VALID_IDENTIFIERS}
+    tokens = TokenArray(code)
+    add_code, add_start, add_end = tokens.codes.append, tokens.starts.append, tokens.ends.append
+    codes = {name: TokenType[name].value for name, _ in token_specification if name in TokenType.__members__}
+    identifier = codes['IDENTIFIER']
+    for match in regex.finditer(code):
+        type = match.lastgroup
+        if type == 'SKIP':
+            continue
+        if type == 'MISMATCH':
+            if text:
+                raise RuntimeError(f'Unexpected character: {match.group()}')
+            start = match.start()
+            make_token(type, code[start:character_end(code, start, len(code))], start)
+        type_code = codes[type]
+        if type_code == identifier and match.group() not in identifiers:
+            if text:
+                raise RuntimeError(f"Error: Invalid identifier '{match.group()}'")
+            make_token(type, match.group(), match.start())
+        start, end = match.span()
+        add_code(type_code)
+        add_start(start)
+        add_end(end)
+    add_code(TokenType.EOF.value)
+    add_start(len(code))
+    add_end(len(code))
     return tokens
 
+# Streaming lexer: the same token regex compiled for bytes, so offsets are
+# byte offsets into the input. A match that ends within STREAM_LOOKAHEAD bytes
+# of the buffer end (or an unterminated string) may still change once more
+# input arrives, so it is carried over to the next chunk instead. An opening
+# quote waits for its closing quote for at most max_token_bytes; past that it
+# is reported as an unexpected character and lexing goes on after it, which
+# is also what lexer() does with a quote that is never closed. With
+# recover=True bad input becomes a Token of type None whose value is the error
+# message, instead of raising, so a consumer can skip past it.
+STREAM_LOOKAHEAD = 16
+compiled_bytes_regex = re.compile(token_regex.encode(), re.ASCII)
+
+def make_token(kind: str, raw: bytes, offset: int, recover: bool = False) -> Token:
+    try:
+        value = bytes(raw).decode('utf-8')
+    except UnicodeDecodeError:
+        return token_error(f'Invalid UTF-8: {bytes(raw)!r}', offset, recover)
+    if kind == 'STRING':
+        return Token(TokenType.STRING, value.strip('"'), offset)
+    if kind == 'IDENTIFIER' and value not in VALID_IDENTIFIERS:
+        return token_error(f"Error: Invalid identifier '{value}'", offset, recover)
+    if kind == 'MISMATCH':
+        return token_error(f'Unexpected character: {value}', offset, recover)
+    return Token(TokenType[kind], value, offset)
+
+def token_error(message: str, offset: int, recover: bool) -> Token:
+    if recover:
+        return Token(None, message, offset)
+    raise RuntimeError(f'{message} at byte {offset}')
+
+def character_end(buffer, start: int, end: int) -> int:
+    # End of the UTF-8 sequence starting at start: the lead byte and the
+    # continuation bytes it announces, as far as they are present. Anything
+    # malformed then fails to decode in make_token.
+    lead = buffer[start]
+    width = 4 if lead >= 0xF0 else 3 if lead >= 0xE0 else 2 if lead >= 0xC0 else 1
+    stop = start + 1
+    while stop < min(start + width, end) and 0x80 <= buffer[stop] < 0xC0:
+        stop += 1
+    return stop
+
+def scan(buffer, pos: int, base: int, final: bool, recover: bool = False) -> Iterator[Token]:
+    match = compiled_bytes_regex.match
+    end = len(buffer)
+    limit = end if final else end - STREAM_LOOKAHEAD
+    while pos < end:
+        m = next_match(match, buffer, pos, end)
+        if m is None:
+            pos = end
+            break
+        kind = m.lastgroup
+        start, stop = m.span()
+        if not final and (stop > limit or (kind == 'MISMATCH' and buffer[start:start + 1] == b'"')):
+            break
+        if kind == 'MISMATCH':
+            # The bytes regex's '.' takes one byte; report the whole
+            # character, as lexer() does.
+            stop = character_end(buffer, start, end)
+        if kind != 'SKIP':
+            yield make_token(kind, buffer[start:stop], base + start, recover)
+        pos = stop
+    return pos
+
+def iter_tokens(source: Union[BinaryIO, mmap.mmap, bytes], chunk_size: int = 1 << 16,
+                recover: bool = False, max_token_bytes: int = 1 << 20) -> Iterator[Token]:
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        end = yield from scan(source, 0, 0, True, recover)
+        yield Token(TokenType.EOF, '', end)
+        return
+
+    buffer = bytearray()
+    base = 0
+    pos = 0
+    # While scan waits on an opening quote at pos, the buffer up to searched
+    # is known to hold no closing quote, so each chunk is searched only once.
+    searched = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        final = not chunk
+        # Keep one byte before the resume point so \b still sees the
+        # preceding character.
+        keep = max(pos - 1, 0)
+        if keep:
+            del buffer[:keep]
+            base += keep
+            pos -= keep
+            searched = max(searched - keep, 0)
+        buffer += chunk
+        if not final and buffer[pos:pos + 1] == b'"':
+            if buffer.find(b'"', max(searched, pos + 1)) < 0:
+                searched = len(buffer)
+                if len(buffer) - pos <= max_token_bytes:
+                    continue
+                yield make_token('MISMATCH', b'"', base + pos, recover)
+                pos += 1
+        pos = yield from scan(buffer, pos, base, final, recover)
+        if final:
+            yield Token(TokenType.EOF, '', base + pos)
+            return
+
+def lex_file(path: str, chunk_size: int = 1 << 16, recover: bool = False) -> Iterator[Token]:
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            yield from iter_tokens(f, chunk_size, recover)
+            return
+        with mapped:
+            yield from iter_tokens(mapped, recover=recover)
+
 if __name__ == '__main__':
     while True:
         try:
@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+import time
+from array import array
+from typing import List
+
+import lexer
+from parser import AstArena, Parser
+
+# A timeline is a flat comma-separated list of statements and statements
+# never nest parentheses, so any ')' outside a string literal ends a
+# statement. Cutting the text right after such a ')' gives chunks whose
+# statements, in order, are the statements of the whole document: the
+# following chunk simply starts with the separating comma.
+#
+# Workers lex and parse their chunk into a TokenArray and an AstArena and
+# send back the raw arrays, a few byte strings per chunk rather than one
+# pickled object per node. The parent splices them into one AstArena over the
+# whole document, shifting only token and node indexes.
+
+def split_points(code: str, parts: int) -> List[int]:
+    bounds = [0]
+    quotes = 0
+    counted = 0
+    for k in range(1, parts):
+        pos = max(len(code) * k // parts, bounds[-1])
+        quotes += code.count('"', counted, pos)
+        counted = pos
+        if quotes % 2:
+            # The target landed inside a string literal; start after it.
+            close = code.find('"', pos)
+            if close < 0:
+                break
+            pos = close + 1
+        while True:
+            paren = code.find(')', pos)
+            quote = code.find('"', pos)
+            if paren < 0 or quote < 0 or paren < quote:
+                break
+            close = code.find('"', quote + 1)
+            if close < 0:
+                paren = -1
+                break
+            pos = close + 1
+        if paren < 0:
+            break
+        pos = paren + 1
+        quotes += code.count('"', counted, pos)
+        counted = pos
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    if bounds[-1] != len(code):
+        bounds.append(len(code))
+    return bounds
+
+def parse_chunk(task):
+    start, text = task
+    try:
+        tokens = lexer.lex_array(text)
+        arena = Parser(tokens).parse_arena()
+    except RuntimeError as e:
+        raise RuntimeError(f"{e} (in chunk starting at offset {start})") from None
+    # Without the chunk's EOF token and Timeline node; spans are made
+    # document offsets here, indexes stay local to the chunk.
+    count = len(tokens) - 1
+    first = last = arena.first_child[0]
+    while last != -1 and arena.next_sibling[last] != -1:
+        last = arena.next_sibling[last]
+    return (tokens.codes[:count].tobytes(),
+            array('q', map(start.__add__, tokens.starts[:count])).tobytes(),
+            array('q', map(start.__add__, tokens.ends[:count])).tobytes(),
+            arena.kind[1:].tobytes(), arena.token[1:].tobytes(), arena.value[1:].tobytes(),
+            arena.first_child[1:].tobytes(), arena.next_sibling[1:].tobytes(), first, last)
+
+def shifted(data: bytes, offset: int) -> array:
+    # Index array from a worker with offset added to every index (-1, no
+    # index, is kept).
+    return array('q', [i + offset if i >= 0 else i for i in array('q', data)])
+
+def merge_chunks(code: str, results) -> AstArena:
+    # The AstArena parse_arena would build for the whole document (node and
+    # token for node and token), over a TokenArray of code.
+    tokens = lexer.TokenArray(code)
+    arena = AstArena(tokens)
+    arena.add(AstArena.TIMELINE)
+    last_statement = -1
+    for codes, starts, ends, kind, token, value, first_child, next_sibling, first, last in results:
+        token_offset = len(tokens)
+        # Node i of the chunk (its Timeline is node 0) becomes node_offset + i.
+        node_offset = len(arena) - 1
+        tokens.codes.frombytes(codes)
+        tokens.starts.frombytes(starts)
+        tokens.ends.frombytes(ends)
+        arena.kind.frombytes(kind)
+        arena.token.extend(shifted(token, token_offset))
+        arena.value.extend(shifted(value, token_offset))
+        arena.first_child.extend(shifted(first_child, node_offset))
+        arena.next_sibling.extend(shifted(next_sibling, node_offset))
+        if first == -1:
+            continue
+        if last_statement == -1:
+            arena.first_child[0] = first + node_offset
+        else:
+            arena.next_sibling[last_statement] = first + node_offset
+        last_statement = last + node_offset
+    tokens.codes.append(lexer.TokenType.EOF.value)
+    tokens.starts.append(len(code))
+    tokens.ends.append(len(code))
+    return arena
+
+def parse_parallel(code: str, workers: int = None, chunks: int = None) -> AstArena:
+    # Same result as Parser(lexer.lex_array(code)).parse_arena().
+    workers = workers or os.cpu_count() or 1
+    chunks = chunks or workers * 4
+    bounds = split_points(code, chunks)
+    tasks = [(start, code[start:end]) for start, end in zip(bounds, bounds[1:])]
+    if workers == 1:
+        return merge_chunks(code, map(parse_chunk, tasks))
+    with multiprocessing.Pool(workers) as pool:
+        return merge_chunks(code, pool.imap(parse_chunk, tasks))
+
+def benchmark(statements: int = 100000):
+    parts = [f'event("Battle {i}", {1000 + i % 900}-{1001 + i % 900}, type = "war")' for i in range(statements)]
+    code = ', '.join(parts)
+
+    start = time.perf_counter()
+    Parser(lexer.lexer(code)).parse()
+    tree_time = time.perf_counter() - start
+    start = time.perf_counter()
+    serial = Parser(lexer.lex_array(code)).parse_arena()
+    serial_time = time.perf_counter() - start
+    print(f"{statements} statements, {len(code)} characters, {os.cpu_count()} cores available")
+    print(f"  serial lexer + parse:           {tree_time:.2f}s")
+    print(f"  serial lex_array + parse_arena: {serial_time:.2f}s")
+
+    bounds = split_points(code, 16)
+    results = [parse_chunk((start, code[start:end])) for start, end in zip(bounds, bounds[1:])]
+    start = time.perf_counter()
+    merge_chunks(code, results)
+    print(f"  parent-side merge of 16 chunks: {time.perf_counter() - start:.2f}s")
+
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        arena = parse_parallel(code, workers)
+        elapsed = time.perf_counter() - start
+        assert all(getattr(arena, name) == getattr(serial, name)
+                   for name in ('kind', 'token', 'value', 'first_child', 'next_sibling'))
+        assert arena.tokens.codes == serial.tokens.codes and arena.tokens.starts == serial.tokens.starts
+        print(f"  {workers} worker(s): {elapsed:.2f}s, speedup {serial_time / elapsed:.2f}x")
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,9 +1,12 @@
 import sys
 import os
+import random
 import subprocess
-from typing import List
+import time
+from array import array
+from typing import Callable, Iterator, List, Optional, TextIO, Union
 import lexer
-from graphviz import Digraph
+from graphviz import Digraph, render
 
 class PTNode:
     def __init__(self, name: str):
@@ -13,50 +16,182 @@ class PTNode:
     def add(self, child: 'PTNode'):
         self.children.append(child)
 
+class AstArena:
+    # Compact AST: one row per node in parallel arrays. Punctuation is not
+    # stored; a Statement keeps its keyword token, a PositionalArg its literal
+    # token and an Assignment its identifier and literal tokens. Token fields
+    # are indexes into the token stream the arena was parsed from.
+    TIMELINE, STATEMENT, POSITIONAL, ASSIGNMENT = range(4)
+    KIND_NAMES = ('Timeline', 'Statement', 'PositionalArg', 'Assignment')
+
+    def __init__(self, tokens: Union[List[lexer.Token], lexer.TokenArray]):
+        self.tokens = tokens
+        self.kind = array('B')
+        self.token = array('q')
+        self.value = array('q')
+        self.first_child = array('q')
+        self.next_sibling = array('q')
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def add(self, kind: int, token: int = -1, value: int = -1) -> int:
+        self.kind.append(kind)
+        self.token.append(token)
+        self.value.append(value)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return len(self.kind) - 1
+
+    def children(self, node: int) -> Iterator[int]:
+        child = self.first_child[node]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def text(self, token: int) -> str:
+        tok = self.tokens[token]
+        return f'"{tok.value}"' if tok.type == lexer.TokenType.STRING else tok.value
+
+    def to_ptnode(self, node: int = 0) -> PTNode:
+        # Rebuilds the PTNode view (without punctuation) iteratively.
+        result = PTNode(self.KIND_NAMES[self.kind[node]])
+        stack = [(node, result)]
+        while stack:
+            index, tree = stack.pop()
+            kind = self.kind[index]
+            if kind == self.STATEMENT:
+                tree.add(PTNode(self.text(self.token[index])))
+            elif kind == self.POSITIONAL:
+                tree.add(PTNode(self.text(self.token[index])))
+            elif kind == self.ASSIGNMENT:
+                tree.add(PTNode(self.text(self.token[index])))
+                tree.add(PTNode(self.text(self.value[index])))
+            for child in self.children(index):
+                subtree = PTNode(self.KIND_NAMES[self.kind[child]])
+                tree.add(subtree)
+                stack.append((child, subtree))
+        return result
+
+# Optional instrumentation hook (see benchmarks/instrument.py), checked once
+# per parse.
+STATS = None
+
 class Parser:
-    def __init__(self, tokens: List[lexer.Token]):
+    # Accepts either a list of Token objects or a lexer.TokenArray; all token
+    # access goes through type_at/value_at so neither form is converted.
+    def __init__(self, tokens: Union[List[lexer.Token], lexer.TokenArray]):
         self.tokens = tokens
         self.pos = 0
+        if isinstance(tokens, lexer.TokenArray):
+            self.type_at = tokens.type
+            self.value_at = tokens.value
+        else:
+            self.type_at = lambda i: tokens[i].type
+            self.value_at = lambda i: tokens[i].value
 
     @property
     def current(self) -> lexer.Token:
         return self.tokens[self.pos]
 
-    def eat(self, ttype: lexer.TokenType) -> lexer.Token:
-        if self.current.type == ttype:
-            tok = self.current
+    @property
+    def current_type(self) -> lexer.TokenType:
+        return self.type_at(self.pos)
+
+    def expect(self, ttype: lexer.TokenType) -> int:
+        current_type = self.type_at(self.pos)
+        if current_type == ttype:
             self.pos += 1
-            return tok
-        raise RuntimeError(f"Expected {ttype} but got {self.current.type}")
+            return self.pos - 1
+        raise RuntimeError(f"Expected {ttype} but got {current_type}")
+
+    def eat(self, ttype: lexer.TokenType) -> str:
+        return self.value_at(self.expect(ttype))
+
+    def parse_arena(self) -> AstArena:
+        # Iterative parser producing an AstArena; same grammar and errors as
+        # parse(), but no PTNode per token and no recursion.
+        stats = STATS
+        started = time.perf_counter() if stats is not None else None
+        T = lexer.TokenType
+        type_at, expect = self.type_at, self.expect
+        arena = AstArena(self.tokens)
+        add, first_child, next_sibling = arena.add, arena.first_child, arena.next_sibling
+        root = add(AstArena.TIMELINE)
+        last_statement = -1
+        while True:
+            ttype = type_at(self.pos)
+            if ttype == T.EOF:
+                break
+            if ttype == T.COMMA:
+                self.pos += 1
+                continue
+            statement = add(AstArena.STATEMENT, expect(T.KEYWORD))
+            if last_statement == -1:
+                first_child[root] = statement
+            else:
+                next_sibling[last_statement] = statement
+            last_statement = statement
+            expect(T.LPAREN)
+
+            last_arg = -1
+            while type_at(self.pos) != T.RPAREN:
+                if last_arg != -1:
+                    expect(T.COMMA)
+                ttype = type_at(self.pos)
+                if ttype == T.STRING or ttype == T.NUMBER:
+                    arg = add(AstArena.POSITIONAL, self.pos)
+                    self.pos += 1
+                else:
+                    name = expect(T.IDENTIFIER)
+                    expect(T.ASSIGN)
+                    ttype = type_at(self.pos)
+                    if ttype != T.STRING and ttype != T.NUMBER:
+                        raise RuntimeError(f"Expected literal but got {ttype}")
+                    arg = add(AstArena.ASSIGNMENT, name, self.pos)
+                    self.pos += 1
+                if last_arg == -1:
+                    first_child[statement] = arg
+                else:
+                    next_sibling[last_arg] = arg
+                last_arg = arg
+            expect(T.RPAREN)
+        if stats is not None:
+            stats.record('parser.arena', started, tokens=self.pos + 1, nodes=len(arena))
+        return arena
 
     def parse(self) -> PTNode:
+        stats = STATS
+        started = time.perf_counter() if stats is not None else None
         root = PTNode('Timeline')
-        while self.current.type != lexer.TokenType.EOF:
-            if self.current.type == lexer.TokenType.COMMA:
-                comma_tok = self.eat(lexer.TokenType.COMMA)
-                root.add(PTNode(comma_tok.value))
+        while self.current_type != lexer.TokenType.EOF:
+            if self.current_type == lexer.TokenType.COMMA:
+                root.add(PTNode(self.eat(lexer.TokenType.COMMA)))
                 continue
             root.add(self.parse_statement())
+        if stats is not None:
+            stats.record('parser', started, time.perf_counter(), tokens=self.pos + 1, nodes=subtree_size(root))
         return root
 
     def parse_statement(self):
         stmt = PTNode("Statement")
-        kw = self.eat(lexer.TokenType.KEYWORD).value
+        kw = self.eat(lexer.TokenType.KEYWORD)
         stmt.add(PTNode(kw))
         self.eat(lexer.TokenType.LPAREN)
         stmt.add(PTNode('('))
 
         first = True
-        while self.current.type != lexer.TokenType.RPAREN:
+        while self.current_type != lexer.TokenType.RPAREN:
             if not first:
                 self.eat(lexer.TokenType.COMMA)
                 stmt.add(PTNode(','))
 
             # 🛠️ NEW: Allow any STRING or NUMBER as a positional argument
-            if self.current.type in (lexer.TokenType.STRING, lexer.TokenType.NUMBER):
+            ttype = self.current_type
+            if ttype in (lexer.TokenType.STRING, lexer.TokenType.NUMBER):
                 arg = PTNode("PositionalArg")
-                token = self.eat(self.current.type)
-                display = f'"{token.value}"' if token.type == lexer.TokenType.STRING else token.value
+                value = self.eat(ttype)
+                display = f'"{value}"' if ttype == lexer.TokenType.STRING else value
                 arg.add(PTNode(display))
                 stmt.add(arg)
             else:
@@ -72,33 +207,170 @@ class Parser:
 
     def parse_assignment(self) -> PTNode:
         node = PTNode('Assignment')
-        idt = self.eat(lexer.TokenType.IDENTIFIER)
-        node.add(PTNode(idt.value))
-        eq = self.eat(lexer.TokenType.ASSIGN)
-        node.add(PTNode(eq.value))
-        if self.current.type == lexer.TokenType.STRING:
+        node.add(PTNode(self.eat(lexer.TokenType.IDENTIFIER)))
+        node.add(PTNode(self.eat(lexer.TokenType.ASSIGN)))
+        if self.current_type == lexer.TokenType.STRING:
             lit = self.eat(lexer.TokenType.STRING)
-            node.add(PTNode(f'"{lit.value}"'))
-        elif self.current.type == lexer.TokenType.NUMBER:
-            num = self.eat(lexer.TokenType.NUMBER)
-            node.add(PTNode(num.value))
+            node.add(PTNode(f'"{lit}"'))
+        elif self.current_type == lexer.TokenType.NUMBER:
+            node.add(PTNode(self.eat(lexer.TokenType.NUMBER)))
         else:
-            raise RuntimeError(f"Expected literal but got {self.current.type}")
+            raise RuntimeError(f"Expected literal but got {self.current_type}")
         return node
 
+class ParseError(RuntimeError):
+    def __init__(self, message: str, offset: int = None):
+        super().__init__(message if offset is None else f"{message} at offset {offset}")
+        self.message = message
+        self.offset = offset
+
+class Statement:
+    # One completed statement from iter_statements. Arguments are kept as the
+    # literal tokens, so their type and offset stay available.
+    __slots__ = ('keyword', 'positional', 'assignments', 'offset')
+
+    def __init__(self, keyword: str, offset: int = None):
+        self.keyword = keyword
+        self.positional: List[lexer.Token] = []
+        self.assignments: List[tuple] = []
+        self.offset = offset
+
+    def __repr__(self):
+        args = [repr(token.value) for token in self.positional]
+        args += [f'{name}={token.value!r}' for name, token in self.assignments]
+        return f"Statement({self.keyword}, {', '.join(args)})"
+
+def iter_statements(tokens, recover: bool = False) -> Iterator[Union[Statement, ParseError]]:
+    # Event-style parser over any token iterable (for example
+    # lexer.iter_tokens): each statement is yielded as soon as its ')' is
+    # read and nothing else is kept. Tokens of type None are lexer errors
+    # (see iter_tokens(recover=True)). Without recover the first error is
+    # raised; with it, the error is yielded and parsing resumes at the next
+    # keyword.
+    T = lexer.TokenType
+    tokens = iter(tokens)
+    tok = next(tokens)
+
+    def fail(expected):
+        if tok.type is None:
+            return ParseError(tok.value, tok.offset)
+        return ParseError(f"Expected {expected} but got {tok.type}", tok.offset)
+
+    while tok.type != T.EOF:
+        if tok.type == T.COMMA:
+            tok = next(tokens)
+            continue
+        try:
+            if tok.type != T.KEYWORD:
+                raise fail(T.KEYWORD)
+            statement = Statement(tok.value, tok.offset)
+            tok = next(tokens)
+            if tok.type != T.LPAREN:
+                raise fail(T.LPAREN)
+            tok = next(tokens)
+            while tok.type != T.RPAREN:
+                if statement.positional or statement.assignments:
+                    if tok.type != T.COMMA:
+                        raise fail(T.COMMA)
+                    tok = next(tokens)
+                if tok.type == T.STRING or tok.type == T.NUMBER:
+                    statement.positional.append(tok)
+                    tok = next(tokens)
+                    continue
+                if tok.type != T.IDENTIFIER:
+                    raise fail(T.IDENTIFIER)
+                name = tok.value
+                tok = next(tokens)
+                if tok.type != T.ASSIGN:
+                    raise fail(T.ASSIGN)
+                tok = next(tokens)
+                if tok.type != T.STRING and tok.type != T.NUMBER:
+                    raise fail('literal')
+                statement.assignments.append((name, tok))
+                tok = next(tokens)
+            tok = next(tokens)
+        except ParseError as error:
+            if not recover:
+                raise
+            yield error
+            while tok.type != T.KEYWORD and tok.type != T.EOF:
+                tok = next(tokens)
+            continue
+        yield statement
+
 def tree_to_dot(root: PTNode) -> Digraph:
     dot = Digraph(format='png')
     dot.attr('node', shape='ellipse', fontname='monospace')
-    def visit(node: PTNode, parent_id: str = None):
+    stack = [(root, None)]
+    while stack:
+        node, parent_id = stack.pop()
         nid = str(id(node))
         dot.node(nid, label=node.name)
         if parent_id:
             dot.edge(parent_id, nid)
-        for child in node.children:
-            visit(child, nid)
-    visit(root)
+        stack.extend((child, nid) for child in reversed(node.children))
     return dot
 
+def dot_quote(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def subtree_size(root: PTNode) -> int:
+    size = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        size += 1
+        stack.extend(node.children)
+    return size
+
+def write_tree_dot(root: PTNode, out: Union[str, TextIO], max_nodes: Optional[int] = None,
+                   max_depth: Optional[int] = None, collapse: Optional[Callable[[PTNode], bool]] = None,
+                   sample: Optional[float] = None, seed: int = 0) -> int:
+    # Streams DOT text for the tree to a path or text file without building a
+    # Digraph. Subtrees deeper than max_depth or for which collapse(node) is
+    # true are drawn as one box with their size. With sample, each child is
+    # kept with that probability and the dropped ones are summarized in one
+    # node. Output stops after max_nodes tree nodes. Returns the number of
+    # tree nodes written.
+    file = open(out, 'w', encoding='utf-8') if isinstance(out, str) else out
+    rng = random.Random(seed)
+    write = file.write
+    written = 0
+    try:
+        write('digraph {\n  node [shape=ellipse, fontname="monospace"];\n')
+        stack = [(root, None, 0)]
+        while stack:
+            node, parent_id, depth = stack.pop()
+            if max_nodes is not None and written >= max_nodes:
+                write(f'  truncated [shape=note, label="truncated after {written} nodes"];\n')
+                break
+            nid = f'n{written}'
+            written += 1
+            children = node.children
+            folded = bool(children) and ((max_depth is not None and depth >= max_depth)
+                                         or (collapse is not None and collapse(node)))
+            if folded:
+                label = f'{node.name} (+{subtree_size(node) - 1} nodes)'
+                write(f'  {nid} [shape=box, label={dot_quote(label)}];\n')
+            else:
+                write(f'  {nid} [label={dot_quote(node.name)}];\n')
+            if parent_id is not None:
+                write(f'  {parent_id} -> {nid};\n')
+            if folded or not children:
+                continue
+            if sample is not None:
+                kept = [child for child in children if rng.random() < sample]
+                if len(kept) < len(children):
+                    write(f'  {nid}_skipped [shape=note, label="{len(children) - len(kept)} not sampled"];\n')
+                    write(f'  {nid} -> {nid}_skipped [style=dashed];\n')
+                children = kept
+            stack.extend((child, nid, depth + 1) for child in reversed(children))
+        write('}\n')
+    finally:
+        if file is not out:
+            file.close()
+    return written
+
 if __name__ == '__main__':
     try:
         code = input("Enter your DSL (empty to quit): ").strip()
@@ -107,7 +379,9 @@ if __name__ == '__main__':
         tokens = lexer.lexer(code)
         parser = Parser(tokens)
         tree = parser.parse()
-        dot_path = tree_to_dot(tree).render(filename='parse_tree', cleanup=True)
+        write_tree_dot(tree, 'parse_tree', max_nodes=5000)
+        dot_path = render('dot', 'png', 'parse_tree')
+        os.remove('parse_tree')
         print(f"Parse‐tree image written to {dot_path}")
         if sys.platform.startswith('darwin'):
             subprocess.call(['open', dot_path])